@@ -2,6 +2,7 @@ import pickle
 from urllib.parse import urlparse
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 
 
 def load_pickle(pickle_file):
@@ -28,10 +29,13 @@ def upload_to_s3(s3_uri: str, local_filepath: str) -> None:
         s3_client.upload_fileobj(data, bucket, key)
 
 
-def download_from_s3(s3_uri: str, local_filepath: str) -> None:
-    """Download a file from S3."""
+def download_from_s3(s3_uri: str, local_filepath: str, transfer_config: TransferConfig | None = None) -> None:
+    """Download a file from S3.
+
+    Large objects are fetched as concurrent ranged GETs (tuned through `transfer_config`) into a
+    temporary file that is only renamed to `local_filepath` once every part has arrived.
+    """
     bucket, key = get_s3_bucket_and_key(s3_uri)
     s3_client = boto3.client("s3")
 
-    with open(local_filepath, "wb") as data:
-        s3_client.download_fileobj(bucket, key, data)
+    s3_client.download_file(bucket, key, local_filepath, Config=transfer_config)
@@ -25,7 +25,7 @@ class DisCoGather(torch.autograd.Function):
         ctx.rank = torch.distributed.get_rank()
 
         gathered_tensors = [torch.zeros_like(tensor) for _ in range(world_size)]
-        torch.distributed.all_gather(gathered_tensors, tensor)
+        torch.distributed.all_gather(gathered_tensors, tensor.contiguous())
 
         gathered_tensors = torch.cat(gathered_tensors, dim=0)
         gathered_tensors.requires_grad_(True)
@@ -34,7 +34,10 @@ class DisCoGather(torch.autograd.Function):
 
     @staticmethod
     def backward(ctx, grad_output):
-        torch.distributed.all_reduce(grad_output, op=torch.distributed.ReduceOp.AVG)
+        # Each rank only holds the gradient of its own loss w.r.t. the gathered tensor, so the
+        # gradient of the local shard is the sum over ranks. DDP averages parameter gradients
+        # afterwards; averaging here as well would shrink the gradient by the world size.
+        torch.distributed.all_reduce(grad_output, op=torch.distributed.ReduceOp.SUM)
         return grad_output[ctx.bs * ctx.rank : ctx.bs * (ctx.rank + 1)]
 
 
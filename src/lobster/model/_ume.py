@@ -1,13 +1,19 @@
+import functools
 import logging
 import os
 import warnings
+import weakref
 from collections.abc import Callable, Sequence
-from typing import Literal
+from contextlib import AbstractContextManager, nullcontext
+from typing import ClassVar, Literal
 
 import lightning as L
 import torch
 import transformers
+from lightning.pytorch.utilities import rank_zero_warn
 from torch import Tensor
+from torch.nn.attention import SDPBackend, sdpa_kernel
+from torchmetrics import Metric
 from torchmetrics.text import Perplexity
 
 from lobster.constants import (
@@ -18,14 +24,82 @@ from lobster.constants import (
 from lobster.tokenization import UMETokenizerTransform
 
 from ._utils_checkpoint import get_ume_checkpoints, load_checkpoint_with_retry
-from .losses import InfoNCELoss, SymileLoss
+from .losses import InfoNCELoss, SigLIPLoss, SymileLoss
 from .modern_bert import FlexBERT
+from .modern_bert._attention import IMPL_USE_FLASH2
+from .modern_bert._padding import pad_input
 
 warnings.filterwarnings("ignore", category=UserWarning, module="torchmetrics.text.perplexity")
 
 logger = logging.getLogger(__name__)
 
 
+@functools.cache
+def _fa2_available(device: str) -> bool:
+    """Check whether flash-attn 2 kernels can actually run on `device`.
+
+    Requires a CUDA device with compute capability >= 8.0 (Ampere or newer), a flash_attn
+    build that the FlexBERT attention layers accept, and a one-step smoke test to succeed,
+    which catches wheels built for a different CUDA / architecture. Cached per device.
+    """
+    torch_device = torch.device(device)
+
+    if torch_device.type != "cuda" or not torch.cuda.is_available() or not IMPL_USE_FLASH2:
+        return False
+
+    if torch.cuda.get_device_capability(torch_device) < (8, 0):
+        return False
+
+    try:
+        from flash_attn import flash_attn_func
+
+        q = torch.randn(1, 16, 8, 64, device=torch_device, dtype=torch.float16)
+        flash_attn_func(q, q, q)
+    except Exception as e:
+        logger.warning(f"flash-attn smoke test failed on {device}: {e}")
+        return False
+
+    return True
+
+
+@functools.cache
+def _warn_prerelease_checkpoints() -> None:
+    """Warn that the pretrained checkpoints are placeholders, once per process."""
+    warnings.warn(
+        "You're using pre-release UME checkpoints which are just placeholder checkpoints for now. Stay tuned for UME release.",
+        stacklevel=3,
+    )
+
+
+def _is_local_file(path) -> bool:
+    return isinstance(path, (str, os.PathLike)) and os.path.isfile(path)
+
+
+def _select_attn_backend(device: str | torch.device) -> Literal["fa2", "sdpa"]:
+    """Pick the fastest attention backend available on `device`.
+
+    flash-attn varlen kernels are used when `_fa2_available`. Everywhere else, PyTorch SDPA
+    dispatches to its own fused kernels (flash / memory-efficient on CUDA, the fused CPU
+    kernel on CPU).
+    """
+    return "fa2" if _fa2_available(str(device)) else "sdpa"
+
+
+def _segment_mean(hidden_states: Tensor, cu_seqlens: Tensor) -> Tensor:
+    """Mean pool an unpadded (total_nnz, hidden_size) token stream into (batch_size, hidden_size)."""
+    seqlens = cu_seqlens.diff()
+    batch_size = seqlens.shape[0]
+
+    seq_ids = torch.repeat_interleave(
+        torch.arange(batch_size, device=hidden_states.device), seqlens, output_size=hidden_states.shape[0]
+    )
+    # Accumulate in float32 so that reduced precision hidden states don't lose precision over long sequences
+    sums = hidden_states.new_zeros(batch_size, hidden_states.shape[-1], dtype=torch.float32)
+    sums.index_add_(0, seq_ids, hidden_states.float())
+
+    return (sums / seqlens.clamp(min=1).unsqueeze(1)).to(hidden_states.dtype)
+
+
 class UME(L.LightningModule):
     """Universal Molecular Encoder.
 
@@ -55,6 +129,7 @@ class UME(L.LightningModule):
         - "symile": Use Symile loss for multiple modality views of the same input (>= 2 views)
         - "clip": Use standard CLIP-style InfoNCE loss (2 views)
         - "disco_clip": Use distributed CLIP loss for memory efficiency (2 views)
+        - "siglip": Use SigLIP pairwise sigmoid loss, which does not normalize over the batch (2 views)
     contrastive_loss_weight : float, default=0.0
         Weight for the contrastive loss. Only relevant if contrastive_loss_type is not None.
         Is used to balance the MLM and contrastive losses:
@@ -77,8 +152,22 @@ class UME(L.LightningModule):
     use_flash_attn : bool, default=True
         Whether to use flash-attn for attention computation. If False, will use standard attention.
         This is useful for CPU-only operation where flash-attn is not available.
+        Only used to resolve `attention_backend="auto"`.
     ckpt_path : str | None, default=None
         Path to a checkpoint file to load. Unused.
+    attention_backend : Literal["fa2", "sdpa", "auto"], default="auto"
+        Attention implementation. Both run on the same unpadded architecture:
+        - "fa2": flash-attn varlen kernels
+        - "sdpa": PyTorch `scaled_dot_product_attention`, padded per sequence inside
+          the attention layers with a key padding mask. On CUDA, restricted to the fused
+          flash / cuDNN / memory-efficient kernels.
+        - "auto": "fa2" if `use_flash_attn`, flash-attn is installed and CUDA is available,
+          else "sdpa". This does not initialize CUDA, so it can't check that the kernels run
+          on the device; `load_from_checkpoint` does (see `_select_attn_backend`)
+    gradient_checkpointing : bool, default=False
+        Whether to recompute each encoder layer's activations during the backward pass
+        instead of storing them. Trades extra compute for lower activation memory,
+        allowing longer `max_length` or larger batches.
 
     Attributes
     ----------
@@ -91,6 +180,9 @@ class UME(L.LightningModule):
         Dimension of the output embeddings.
     frozen : bool
         Indicates whether model parameters are frozen.
+    inference_dtype : torch.dtype | None
+        Autocast dtype used by `embed` while the model is frozen and on CUDA.
+        Set by `freeze`; None means full precision.
 
 
     Examples
@@ -111,6 +203,10 @@ class UME(L.LightningModule):
     torch.Size([1, 768])
     """
 
+    # Models returned by `from_pretrained`, keyed by their loading arguments. Held weakly so a
+    # model is freed as soon as the caller drops it
+    _pretrained_models: ClassVar[weakref.WeakValueDictionary[tuple, "UME"]] = weakref.WeakValueDictionary()
+
     def __init__(
         self,
         model_name: Literal["UME_mini", "UME_small", "UME_medium", "UME_large"] = "UME_mini",
@@ -120,7 +216,7 @@ class UME(L.LightningModule):
         beta2: float = 0.98,
         eps: float = 1e-12,
         mask_percentage: float = 0.25,
-        contrastive_loss_type: Literal[None, "symile", "clip", "disco_clip"] = None,
+        contrastive_loss_type: Literal[None, "symile", "clip", "disco_clip", "siglip"] = None,
         contrastive_loss_weight: float = 0.0,
         contrastive_temperature: float = 0.07,
         scheduler: SchedulerType = "constant_with_warmup",
@@ -130,49 +226,48 @@ class UME(L.LightningModule):
         scheduler_kwargs: dict | None = None,
         use_flash_attn: bool = True,
         ckpt_path: str | None = None,
+        attention_backend: Literal["fa2", "sdpa", "auto"] = "auto",
+        gradient_checkpointing: bool = False,
     ) -> None:
         """Initialize the Universal Molecular Encoder"""
         super().__init__()
 
         self.save_hyperparameters()
 
-        # Instantiate tokenizer transforms for each modality
+        # Instantiate tokenizer transforms for each modality, loading their tokenizers in parallel
+        modalities = [Modality.AMINO_ACID, Modality.SMILES, Modality.NUCLEOTIDE]
+        UMETokenizerTransform.batch_load(modalities)
+
         self.tokenizer_transforms = {
             modality: UMETokenizerTransform(modality, max_length=max_length, return_modality=True)
-            for modality in [Modality.AMINO_ACID, Modality.SMILES, Modality.NUCLEOTIDE]
+            for modality in modalities
         }
 
         # Get any tokenizer to get the special tokens
         tokenizer = list(self.tokenizer_transforms.values())[0].tokenizer
 
-        # Prepare model kwargs with flash-attn setting
+        # The consolidated vocabulary is static, so build it once
+        self._vocab = self._build_vocab()
+        self._vocab_size = len(self._vocab)
+
+        if attention_backend == "auto":
+            # Don't probe the device here: that would initialize CUDA in the constructor, which
+            # breaks fork-based DDP and makes every rank allocate on cuda:0 before `set_device`.
+            # `load_from_checkpoint` checks the actual target device
+            attention_backend = "fa2" if use_flash_attn and IMPL_USE_FLASH2 and torch.cuda.is_available() else "sdpa"
+
+        # Both attention backends use the unpadded architecture, so checkpoints
+        # can be loaded with either of them
         model_kwargs = model_kwargs or {}
-        model_kwargs["use_fa2"] = use_flash_attn
-
-        # Important: If loading from checkpoint, preserve the original architecture
-        # A checkpoint trained with flash attention has unpadded layers that can't be changed
-        # We can still disable flash attention at the layer level while keeping unpadded architecture
-        if ckpt_path is not None:
-            # Always use unpadded architecture when loading from checkpoint
-            # The individual attention layers will respect the use_fa2 setting
-            model_kwargs["padding"] = "unpadded"
-            if not use_flash_attn:
-                model_kwargs["use_sdpa_attn_mask"] = True
-        else:
-            # When creating a new model, choose the appropriate architecture
-            if use_flash_attn:
-                # Flash attention works with unpadded architecture
-                model_kwargs["padding"] = "unpadded"
-            else:
-                # SDPA requires padded architecture to work correctly
-                model_kwargs["padding"] = "padded"
-                model_kwargs["use_sdpa_attn_mask"] = True
+        model_kwargs["use_fa2"] = attention_backend == "fa2"
+        model_kwargs["padding"] = "unpadded"
+        model_kwargs["use_sdpa_attn_mask"] = attention_backend == "sdpa"
 
         # Instantiate the model
         self.model = FlexBERT(
             model_name=model_name,
             max_length=max_length,
-            vocab_size=len(self.get_vocab()),
+            vocab_size=self._vocab_size,
             lr=lr,
             beta1=beta1,
             beta2=beta2,
@@ -189,13 +284,18 @@ class UME(L.LightningModule):
             eos_token_id=tokenizer.eos_token_id,
         )
 
+        if gradient_checkpointing:
+            self.gradient_checkpointing_enable()
+
         self.max_length = max_length
         self.embedding_dim = self.model.config.hidden_size
         self.frozen = False
+        self.inference_dtype = None
         self.contrastive_loss_type = contrastive_loss_type
         self.contrastive_loss_weight = contrastive_loss_weight
         self.contrastive_temperature = contrastive_temperature
-        self.use_flash_attn = use_flash_attn
+        self.attention_backend = attention_backend
+        self.use_flash_attn = attention_backend == "fa2"
         self._lr = lr
         self._beta1 = beta1
         self._beta2 = beta2
@@ -211,11 +311,21 @@ class UME(L.LightningModule):
             temperature=contrastive_temperature,
             use_disco=contrastive_loss_type == "disco_clip",
         )
+        # SigLIP has learnable temperature and bias, so only register it when used
+        self.siglip_loss_fn = SigLIPLoss() if contrastive_loss_type == "siglip" else None
+
+        # Metrics need to be registered submodules so that Lighting will handle moving them to the right device
+        self.perplexities = torch.nn.ModuleDict(
+            {
+                f"{stage}_{modality.value}": Perplexity(ignore_index=-100)
+                for stage in ("train", "val")
+                for modality in Modality
+            }
+        )
 
-        # Metrics need to be attributes so that Lighting will handle moving them to the right device
-        for modality in Modality:
-            setattr(self, f"train_perplexity/{modality.value}", Perplexity(ignore_index=-100))
-            setattr(self, f"val_perplexity/{modality.value}", Perplexity(ignore_index=-100))
+        # Values to log for the current step, collected by the loss helpers and
+        # logged together at the end of training_step / validation_step
+        self._step_logs: dict[str, Tensor | Metric] = {}
 
     @property
     def modalities(self) -> list[str]:
@@ -274,9 +384,8 @@ class UME(L.LightningModule):
         >>> print(tokens["attention_mask"].sum())  # Number of non-padding tokens
         tensor(23)
         """
-        modality_enum = Modality(modality) if isinstance(modality, str) else modality
-
-        return self.tokenizer_transforms[modality_enum].tokenizer
+        # Modality is a StrEnum, so plain strings hash and compare equal to their members
+        return self.tokenizer_transforms[modality].tokenizer
 
     def get_vocab(self) -> dict[int, str]:
         """Get a consolidated vocabulary from all tokenizers.
@@ -285,7 +394,8 @@ class UME(L.LightningModule):
         -------
         dict[int, str]
             A dictionary mapping token IDs to token strings, sorted by token ID.
-            Reserved tokens are excluded.
+            Reserved tokens are excluded. The dictionary is computed once at
+            initialization and shared between calls, so it should not be modified.
             Important! Tokens are not unique across modalities and may overlap.
             If the vocabulary is reversed where token strings are keys,
             information will be lost. Use with caution.
@@ -297,6 +407,10 @@ class UME(L.LightningModule):
         >>> print(len(vocab))  # Size of vocabulary
         1536  # Example size
         """
+        return self._vocab
+
+    def _build_vocab(self) -> dict[int, str]:
+        """Consolidate the vocabularies of all tokenizers, sorted by token ID."""
         tokenizers = [transform.tokenizer for transform in self.tokenizer_transforms.values()]
 
         vocab = {
@@ -308,12 +422,19 @@ class UME(L.LightningModule):
 
         return dict(sorted(vocab.items(), key=lambda item: item[0]))
 
-    def freeze(self) -> None:
+    def freeze(self, inference_dtype: torch.dtype | None = torch.bfloat16) -> None:
         """Freeze the model parameters.
 
         This method sets requires_grad=False for all model parameters
         and puts the model in evaluation mode.
 
+        Parameters
+        ----------
+        inference_dtype : torch.dtype | None, default=torch.bfloat16
+            Dtype to autocast the encoder to in `embed` while frozen. Only applies on CUDA
+            devices that support it; embeddings are returned in float32. Weights are not
+            cast, so `unfreeze` restores full precision training. Pass None to disable.
+
         Examples
         --------
         >>> encoder = UME(model_name="UME_mini")
@@ -335,6 +456,7 @@ class UME(L.LightningModule):
 
         self.model.eval()
         self.frozen = True
+        self.inference_dtype = inference_dtype
 
     def unfreeze(self) -> None:
         """Unfreeze the model parameters.
@@ -358,15 +480,44 @@ class UME(L.LightningModule):
 
         self.model.train()
         self.frozen = False
+        self.inference_dtype = None
+
+    def gradient_checkpointing_enable(self) -> None:
+        """Enable per-layer gradient checkpointing in the encoder.
+
+        Activations of each encoder layer are recomputed during the backward
+        pass instead of being stored, which reduces memory at the cost of
+        extra compute. Only has an effect in training mode.
+
+        Examples
+        --------
+        >>> encoder = UME(model_name="UME_mini")
+        >>> encoder.gradient_checkpointing_enable()
+        """
+        self.model.gradient_checkpointing_enable()
+
+    def gradient_checkpointing_disable(self) -> None:
+        """Disable per-layer gradient checkpointing in the encoder."""
+        self.model.gradient_checkpointing_disable()
+
+    def _attention_context(self) -> AbstractContextManager:
+        """Restrict SDPA to fused kernels on CUDA so it never falls back to the math kernel."""
+        if self.attention_backend == "sdpa" and self.device.type == "cuda":
+            return sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.CUDNN_ATTENTION, SDPBackend.EFFICIENT_ATTENTION])
+
+        return nullcontext()
 
     def _extract_batch_components(
         self,
         batch: dict[str, Tensor | list[Modality]],
         index: int,
     ) -> dict[str, Tensor | list[Modality]]:
-        """Extract components for a specific view from a combined batch."""
-        input_ids = batch["input_ids"][:, index, :].unsqueeze(1).contiguous()
-        attention_mask = batch["attention_mask"][:, index, :].unsqueeze(1).contiguous()
+        """Extract components for a specific view from a combined batch.
+
+        Returns (batch_size, length) views into the combined batch rather than copies.
+        """
+        input_ids = batch["input_ids"][:, index, :]
+        attention_mask = batch["attention_mask"][:, index, :]
 
         modality_list = batch["metadata"]["modality"] if "metadata" in batch else batch["modality"]
         modality = [t[index] for t in modality_list]
@@ -377,14 +528,22 @@ class UME(L.LightningModule):
             "modality": modality,
         }
 
-    def _split_combined_batch(
-        self,
-        combined_batch: dict[str, Tensor | list[Modality]],
-    ) -> tuple[dict[str, Tensor | list[Modality]], ...]:
-        """Split a combined batch of N inputs into N separate batches."""
-        num_splits = combined_batch["input_ids"].shape[1]
+    def _embed_combined_batch(self, batch: dict[str, Tensor | list[Modality]]) -> list[Tensor]:
+        """Embed all N views of a combined batch with a single encoder forward.
 
-        return tuple(self._extract_batch_components(combined_batch, i) for i in range(num_splits))
+        The (batch_size, num_views, length) inputs are flattened to (batch_size * num_views, length)
+        and the pooled embeddings are split back into one (batch_size, hidden_size) tensor per view.
+        """
+        batch_size, num_views, length = batch["input_ids"].shape
+
+        inputs = {
+            "input_ids": batch["input_ids"].reshape(batch_size * num_views, length),
+            "attention_mask": batch["attention_mask"].reshape(batch_size * num_views, length),
+        }
+
+        embeddings = self.embed(inputs)
+
+        return list(embeddings.view(batch_size, num_views, -1).unbind(1))
 
     def embed(
         self,
@@ -398,7 +557,7 @@ class UME(L.LightningModule):
         inputs : dict[str, Tensor]
             Dictionary of encoded inputs. Must contain 'input_ids' and 'attention_mask'.
         aggregate : bool, default=True
-            Whether to average pool over the sequence length dimension.
+            Whether to average pool over the non-padding tokens of each sequence.
 
         Returns
         -------
@@ -409,34 +568,79 @@ class UME(L.LightningModule):
         if not all(k in inputs for k in {"input_ids", "attention_mask"}):
             raise ValueError("Missing required keys in inputs: 'input_ids' or 'attention_mask'")
 
-        x = {k: v.to(self.model.device) for k, v in inputs.items() if isinstance(v, Tensor)}
-
-        # Ensure input_ids and attention_mask are 3D (batch_size, 1, length)
-        for key in ["input_ids", "attention_mask"]:
-            if x[key].dim() == 2:
-                x[key] = x[key].unsqueeze(1)
-
-        assert x["input_ids"].ndim == 3
-        assert x["input_ids"].shape[1] == 1, (
-            f"Input IDs must have shape (batch_size, 1, length), got {x['input_ids'].shape}"
-        )
+        # Copies from pinned host memory run asynchronously; the encoder is queued on
+        # the same stream, so it still waits for them
+        device = torch.device(self.model.device)
+        non_blocking = device.type == "cuda"
+        x = {k: v.to(device, non_blocking=non_blocking) for k, v in inputs.items() if isinstance(v, Tensor)}
+
+        input_ids = x["input_ids"]
+        attention_mask = x["attention_mask"]
+
+        # Accept both (batch_size, length) and (batch_size, 1, length)
+        if input_ids.dim() == 3:
+            assert input_ids.shape[1] == 1, f"Input IDs must have shape (batch_size, 1, length), got {input_ids.shape}"
+            input_ids = input_ids.squeeze(1)
+            attention_mask = attention_mask.squeeze(1)
+
+        if not self.frozen:
+            return self._encode(input_ids, attention_mask, aggregate)
+
+        autocast_dtype = self._inference_autocast_dtype()
+
+        # inference_mode skips autograd bookkeeping entirely. The output is copied outside of it
+        # so that callers can still use the embeddings in autograd, e.g. to train a head on top
+        with (
+            torch.inference_mode(),
+            torch.autocast("cuda", dtype=autocast_dtype) if autocast_dtype is not None else nullcontext(),
+        ):
+            embeddings = self._encode(input_ids, attention_mask, aggregate)
+
+        return embeddings.to(torch.float32 if autocast_dtype is not None else embeddings.dtype, copy=True)
+
+    def _inference_autocast_dtype(self) -> torch.dtype | None:
+        """Return the dtype to autocast frozen inference to, or None if it isn't supported here."""
+        if self.inference_dtype is None or self.device.type != "cuda":
+            return None
+
+        # bf16 is only emulated (and slower than fp32) before compute capability 8.0
+        if self.inference_dtype == torch.bfloat16 and torch.cuda.get_device_capability(self.device) < (8, 0):
+            return None
+
+        return self.inference_dtype
+
+    def _encode(self, input_ids: Tensor, attention_mask: Tensor, aggregate: bool) -> Tensor:
+        """Run the encoder on (batch_size, length) inputs and optionally mean pool over real tokens."""
+        batch_size, seq_len = input_ids.shape
+
+        with self._attention_context():
+            if self.model.config.padding == "unpadded":
+                # Unpad once before the encoder so that the encoder layers
+                # only ever see the (total_nnz, hidden_size) token stream
+                unpadded_input_ids, indices, cu_seqlens, max_seqlen, position_ids = self.model._unpad_inputs(
+                    input_ids, attention_mask
+                )
+                hidden_states = self.model.model(
+                    input_ids=unpadded_input_ids,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    indices=indices,
+                    cu_seqlens=cu_seqlens,
+                    max_seqlen=max_seqlen,
+                )
 
-        if self.frozen:
-            with torch.no_grad():
-                embeddings = self.model.tokens_to_latents(**x)
-        else:
-            embeddings = self.model.tokens_to_latents(x["input_ids"], x["attention_mask"])
+                if aggregate:
+                    # Mean pool directly over the real tokens without re-padding
+                    return _segment_mean(hidden_states, cu_seqlens)
 
-        # Reshape to (batch_size, seq_len, hidden_size)
-        batch_size = x["input_ids"].size(0)
-        seq_len = x["input_ids"].size(-1)
+                return pad_input(hidden_states, indices, batch_size, seq_len)
 
-        if self.model.config.padding == "unpadded":
-            embeddings = embeddings.view(batch_size, seq_len, -1)
+            embeddings = self.model.model(input_ids=input_ids, attention_mask=attention_mask)
 
         if aggregate:
-            # Use mean pooling over sequence length dimension
-            embeddings = embeddings.mean(dim=1)
+            # Mean pool over the non-padding tokens of each sequence
+            mask = attention_mask.unsqueeze(-1).to(embeddings.dtype)
+            embeddings = (embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
 
         return embeddings
 
@@ -457,7 +661,11 @@ class UME(L.LightningModule):
         Returns
         -------
         Tensor
-            Embeddings of the input sequences.
+            Embeddings of the input sequences, of shape (batch_size, hidden_size) if `aggregate`
+            is True. Otherwise the token embeddings of shape (batch_size, seq_len, hidden_size),
+            where seq_len is the length of the longest tokenized sequence in this batch rather
+            than `max_length`, so outputs from different calls can differ in seq_len and have to
+            be padded before they are stacked.
         """
         if isinstance(sequences, str):
             sequences = [sequences]
@@ -465,21 +673,23 @@ class UME(L.LightningModule):
         # Get the tokenizer transform for the specified modality
         tokenizer_transform = self.tokenizer_transforms[modality]
 
-        # Tokenize the sequences
-        encoded_batch = tokenizer_transform(sequences)
+        # Tokenize the whole batch in one call, padding only to the longest sequence
+        encoded_batch = tokenizer_transform.batch_encode(sequences)
 
         # Get input_ids and attention_mask
         input_ids = encoded_batch["input_ids"]
         attention_mask = encoded_batch["attention_mask"]
 
-        # Move tensors to the same device as the model
         try:
             device = next(self.parameters()).device
         except StopIteration:
             # Fallback for testing or when model has no parameters
             device = getattr(self.model, "device", torch.device("cpu"))
-        input_ids = input_ids.to(device)
-        attention_mask = attention_mask.to(device)
+
+        # Pin the tokenized batch so that embed() can copy it to the GPU without blocking
+        if torch.device(device).type == "cuda":
+            input_ids = input_ids.pin_memory()
+            attention_mask = attention_mask.pin_memory()
 
         # Create inputs dictionary
         inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
@@ -563,12 +773,13 @@ class UME(L.LightningModule):
                 logger.debug(f"After _prepare_inputs - input_ids_flat shape: {input_ids_flat.shape}")
 
                 # Get model outputs without masking (we want the full sequence)
-                hidden_states = self.model.model(
-                    input_ids=input_ids_flat,
-                    attention_mask=attention_mask_flat,
-                    cu_seqlens=cu_seqlens,
-                    max_seqlen=self.max_length,
-                )
+                with self._attention_context():
+                    hidden_states = self.model.model(
+                        input_ids=input_ids_flat,
+                        attention_mask=attention_mask_flat,
+                        cu_seqlens=cu_seqlens,
+                        max_seqlen=self.max_length,
+                    )
 
                 logger.debug(f"Hidden states shape: {hidden_states.shape}")
 
@@ -619,8 +830,13 @@ class UME(L.LightningModule):
                 return [0.0] * len(sequences)
 
     def configure_optimizers(self):
+        param_groups = [{"params": self.model.parameters()}]
+
+        if self.siglip_loss_fn is not None:
+            param_groups.append({"params": self.siglip_loss_fn.parameters(), "weight_decay": 0.0})
+
         optimizer = torch.optim.AdamW(
-            self.model.parameters(),
+            param_groups,
             lr=self._lr,
             betas=(self._beta1, self._beta2),
             eps=self._eps,
@@ -652,37 +868,15 @@ class UME(L.LightningModule):
         embeddings_a, embeddings_b = embeddings
         assert embeddings_a.shape == embeddings_b.shape
 
-        loss = self.infonce_loss_fn(embeddings_a, embeddings_b)
+        if self.siglip_loss_fn is not None:
+            embeddings_a = torch.nn.functional.normalize(embeddings_a, dim=-1)
+            embeddings_b = torch.nn.functional.normalize(embeddings_b, dim=-1)
 
-        return loss
+            return self.siglip_loss_fn(embeddings_a, embeddings_b)
 
-    def _infonce_step(
-        self,
-        batch_a: dict[str, Tensor | list[Modality]],
-        batch_b: dict[str, Tensor | list[Modality]],
-        stage: Literal["train", "val"],
-    ) -> Tensor:
-        """Perform a contrastive step with optional MLM mixing."""
-        # Compute embeddings for both batches
-        embeddings = [self.embed(batch) for batch in [batch_a, batch_b]]
-
-        contrastive_loss = (
-            self._compute_infonce_loss(embeddings, stage)
-            if self.contrastive_loss_weight > 0
-            else torch.tensor(0.0, device=self.device)
-        )
-
-        mlm_loss = (
-            self._compute_mlm_loss(batch_a, stage)
-            if self.contrastive_loss_weight != 1.0
-            else torch.tensor(0.0, device=self.device)
-        )
+        loss = self.infonce_loss_fn(embeddings_a, embeddings_b)
 
-        return self._compute_weighted_loss(
-            contrastive_loss=contrastive_loss,
-            mlm_loss=mlm_loss,
-            stage=stage,
-        )
+        return loss
 
     def _process_batch_for_modality_metrics(
         self,
@@ -700,21 +894,25 @@ class UME(L.LightningModule):
         logits_reshaped = logits.view(batch_size, seq_length, -1)
         labels_reshaped = labels.view(batch_size, seq_length)
 
-        for modality in set(modalities):
-            mask = torch.tensor([m == modality for m in modalities], device=self.device, dtype=torch.bool)
-            if not mask.any():
-                continue
+        # Bucket batch indices by modality in a single pass
+        buckets: dict[Modality, list[int]] = {}
+        for i, modality in enumerate(modalities):
+            buckets.setdefault(modality, []).append(i)
 
-            metric_name = f"{stage}_perplexity/{modality}"
+        for modality, indices in buckets.items():
+            metric_key = f"{stage}_{modality}"
 
-            if not hasattr(self, metric_name):
-                logger.warning(f"Metric {metric_name} not found in {self.__class__.__name__}. Skipping.")
+            if metric_key not in self.perplexities:
+                logger.warning(f"Metric {metric_key} not found in {self.__class__.__name__}. Skipping.")
                 continue
 
-            metric = getattr(self, metric_name)
-            metric(logits_reshaped[mask], labels_reshaped[mask])
+            # index_select with host-built indices avoids the device sync of boolean-mask indexing
+            index = torch.tensor(indices, dtype=torch.long, device=logits.device)
+
+            metric = self.perplexities[metric_key]
+            metric(logits_reshaped.index_select(0, index), labels_reshaped.index_select(0, index))
 
-            self.log(metric_name, metric, rank_zero_only=True, sync_dist=True)
+            self._step_logs[f"{stage}_perplexity/{modality}"] = metric
 
     def _compute_weighted_loss(
         self,
@@ -723,15 +921,26 @@ class UME(L.LightningModule):
         stage: Literal["train", "val"],
     ) -> Tensor:
         """Compute weighted loss combining MLM and contrastive losses."""
-        # Log individual losses
-        self.log(f"mlm_{stage}_loss", mlm_loss, rank_zero_only=True, sync_dist=True)
-        self.log(f"contrastive_{stage}_loss", contrastive_loss, rank_zero_only=True, sync_dist=True)
+        # Log individual losses; the total loss is logged by the step itself
+        self._step_logs[f"mlm_{stage}_loss"] = mlm_loss
+        self._step_logs[f"contrastive_{stage}_loss"] = contrastive_loss
 
         # Compute weighted loss
-        total_loss = (1 - self.contrastive_loss_weight) * mlm_loss + self.contrastive_loss_weight * contrastive_loss
-        self.log(f"{stage}_loss", total_loss, rank_zero_only=True, sync_dist=True)
-
-        return total_loss
+        return (1 - self.contrastive_loss_weight) * mlm_loss + self.contrastive_loss_weight * contrastive_loss
+
+    def _log_step(self, loss: Tensor, stage: Literal["train", "val"]) -> None:
+        """Log the step loss together with everything collected during the step in one call."""
+        step_logs, self._step_logs = self._step_logs, {}
+        step_logs[f"{stage}_loss"] = loss
+
+        # Validation values only need to be reduced once per epoch
+        self.log_dict(
+            step_logs,
+            on_step=stage == "train",
+            on_epoch=stage == "val",
+            rank_zero_only=True,
+            sync_dist=True,
+        )
 
     def _compute_mlm_loss(
         self,
@@ -744,12 +953,13 @@ class UME(L.LightningModule):
         masked_input_ids, labels = self.model._mask_inputs(input_ids)
 
         # Get model outputs
-        hidden_states = self.model.model(
-            input_ids=masked_input_ids,
-            attention_mask=attention_mask,
-            cu_seqlens=cu_seqlens,
-            max_seqlen=self.max_length,
-        )
+        with self._attention_context():
+            hidden_states = self.model.model(
+                input_ids=masked_input_ids,
+                attention_mask=attention_mask,
+                cu_seqlens=cu_seqlens,
+                max_seqlen=self.max_length,
+            )
 
         # Get logits from decoder and reshape for loss calculation
         logits = self.model.decoder(hidden_states)
@@ -760,8 +970,7 @@ class UME(L.LightningModule):
         loss = self.model.loss_fn(logits, labels)
 
         # Log overall metrics
-        perplexity = torch.exp(loss)
-        self.log(f"{stage}_perplexity", perplexity, rank_zero_only=True, sync_dist=True)
+        self._step_logs[f"{stage}_perplexity"] = torch.exp(loss)
 
         # Process per-modality metrics
         modalities = batch["metadata"]["modality"] if "metadata" in batch else batch["modality"]
@@ -781,40 +990,64 @@ class UME(L.LightningModule):
 
     def _contrastive_step(
         self,
-        *batches: dict[str, Tensor | list[Modality]],
+        batch: dict[str, Tensor | list[Modality]],
         stage: Literal["train", "val"],
     ) -> Tensor:
-        """Perform a contrastive step with optional MLM mixing."""
-        if len(batches) < 2:
-            raise ValueError(f"Contrastive loss requires at least 2 views but got {len(batches)}: {batches}")
+        """Perform a contrastive step over a combined batch of N views with optional MLM mixing."""
+        num_views = batch["input_ids"].shape[1]
 
-        if self.contrastive_loss_type in ["clip", "disco_clip"]:
-            if len(batches) != 2:
-                raise ValueError("InfoNCE loss requires exactly 2 views")
+        if num_views < 2:
+            raise ValueError(f"Contrastive loss requires at least 2 views but got {num_views}")
 
-        embeddings = [self.embed(batch) for batch in batches]
+        if self.contrastive_loss_type in ["clip", "disco_clip", "siglip"]:
+            if num_views != 2:
+                raise ValueError(f"{self.contrastive_loss_type} loss requires exactly 2 views")
 
         contrastive_loss_fn = (
             self._compute_symile_loss if self.contrastive_loss_type == "symile" else self._compute_infonce_loss
         )
 
-        contrastive_loss = (
-            contrastive_loss_fn(embeddings, stage=stage)
-            if self.contrastive_loss_weight > 0
-            else torch.tensor(0.0, device=self.device)
+        return self._compute_step_loss(
+            lambda: contrastive_loss_fn(self._embed_combined_batch(batch), stage=stage),
+            mlm_batch=self._extract_batch_components(batch, 0),
+            stage=stage,
         )
 
-        mlm_loss = (
-            self._compute_mlm_loss(batches[0], stage)
-            if self.contrastive_loss_weight != 1.0
-            else torch.tensor(0.0, device=self.device)
-        )
+    @property
+    def _do_mlm(self) -> bool:
+        return self.contrastive_loss_weight != 1.0
 
-        return self._compute_weighted_loss(
-            contrastive_loss=contrastive_loss,
-            mlm_loss=mlm_loss,
-            stage=stage,
-        )
+    @property
+    def _do_contrastive(self) -> bool:
+        return self.contrastive_loss_weight > 0
+
+    def _compute_step_loss(
+        self,
+        compute_contrastive_loss: Callable[[], Tensor],
+        mlm_batch: dict[str, Tensor | list[Modality]],
+        stage: Literal["train", "val"],
+    ) -> Tensor:
+        """Compute only the losses that contribute to the objective for the current contrastive_loss_weight.
+
+        MLM-only and contrastive-only steps return their loss directly instead of weighting it
+        against a zero placeholder for the disabled loss.
+        """
+        if not self._do_contrastive:
+            mlm_loss = self._compute_mlm_loss(mlm_batch, stage)
+            self._step_logs[f"mlm_{stage}_loss"] = mlm_loss
+
+            return mlm_loss
+
+        contrastive_loss = compute_contrastive_loss()
+
+        if not self._do_mlm:
+            self._step_logs[f"contrastive_{stage}_loss"] = contrastive_loss
+
+            return contrastive_loss
+
+        mlm_loss = self._compute_mlm_loss(mlm_batch, stage)
+
+        return self._compute_weighted_loss(mlm_loss=mlm_loss, contrastive_loss=contrastive_loss, stage=stage)
 
     def _delegate_step_by_batch_shape(
         self,
@@ -836,9 +1069,7 @@ class UME(L.LightningModule):
                 raise ValueError(f"Contrastive loss type is None but num_views > 1 ({num_views})")
             return self._compute_mlm_loss(batch, stage)
 
-        batches = self._split_combined_batch(batch)
-
-        return self._contrastive_step(*batches, stage=stage)
+        return self._contrastive_step(batch, stage=stage)
 
     def training_step(
         self,
@@ -860,7 +1091,7 @@ class UME(L.LightningModule):
             Computed loss
         """
         loss = self._delegate_step_by_batch_shape(batch, "train")
-        self.log("train_loss", loss, rank_zero_only=True, sync_dist=True)
+        self._log_step(loss, "train")
 
         return loss
 
@@ -884,7 +1115,7 @@ class UME(L.LightningModule):
             Computed loss
         """
         loss = self._delegate_step_by_batch_shape(batch, "val")
-        self.log("val_loss", loss, rank_zero_only=True, sync_dist=True)
+        self._log_step(loss, "val")
 
         return loss
 
@@ -895,13 +1126,15 @@ class UME(L.LightningModule):
         *args,
         use_flash_attn: bool | None = None,
         device: str | None = None,
+        torch_dtype: torch.dtype | None = None,
+        compile: bool | str = False,
         **kwargs,
     ) -> "UME":
         """Load a model from a checkpoint with device-specific configuration.
 
-        This method configures the model based on the specified or available device:
-        - For CPU: Uses padded architecture with SDPA attention mask
-        - For GPU: Uses unpadded architecture with Flash Attention
+        This method configures the attention backend based on the specified or available device:
+        - For GPU with flash-attn installed: Uses Flash Attention
+        - Otherwise: Uses PyTorch SDPA attention, which picks the fused kernel for the device
 
         Parameters
         ----------
@@ -909,8 +1142,17 @@ class UME(L.LightningModule):
             Path to the checkpoint file.
         use_flash_attn : bool | None, optional
             Whether to use flash attention. If None, will be determined based on device.
+            If True but flash attention is not available on the device, falls back to SDPA.
         device : str | None, optional
             Device to load the model on ("cpu" or "cuda"). If None, will be determined automatically.
+        torch_dtype : torch.dtype | None, optional
+            Dtype to cast the model's floating point weights to, e.g. `torch.bfloat16` for
+            half-precision inference. Applied before moving the model to `device`, so only the
+            cast weights are transferred. If None, the weights keep the checkpoint's dtype.
+        compile : bool | str, optional
+            Whether to compile the encoder with `torch.compile` after moving it to `device`. A string
+            is used as the compile mode, True means "reduce-overhead" (CUDA graphs). The first forward
+            pass for each new input shape pays the compilation cost. Default is False.
         *args
             Additional positional arguments to pass to the parent class's load_from_checkpoint.
         **kwargs
@@ -935,30 +1177,80 @@ class UME(L.LightningModule):
         else:
             device = "cuda" if torch.cuda.is_available() else "cpu"
 
-        # Determine flash attention setting
-        if use_flash_attn is None:
-            use_flash_attn = device == "cuda"
+        # Configure attention backend based on what the device actually supports
+        attention_backend = _select_attn_backend(device) if use_flash_attn is not False else "sdpa"
 
-        # Configure model based on device
-        model_kwargs = kwargs.pop("model_kwargs", {})
-        model_kwargs.update(
-            {
-                "use_fa2": use_flash_attn,
-                "padding": "unpadded" if use_flash_attn else "padded",
-                "use_sdpa_attn_mask": not use_flash_attn,
-            }
-        )
-        kwargs["model_kwargs"] = model_kwargs
-        kwargs["use_flash_attn"] = use_flash_attn
+        if use_flash_attn and attention_backend != "fa2":
+            logger.warning(f"Flash attention is not available on {device}; using PyTorch SDPA attention instead.")
+
+        kwargs["use_flash_attn"] = attention_backend == "fa2"
+        kwargs["attention_backend"] = attention_backend
 
-        # Load the model using the parent class's method
-        model = super().load_from_checkpoint(checkpoint_path, *args, **kwargs)
+        # The model is constructed on CPU, so load the checkpoint tensors there too. Otherwise
+        # Lightning restores them to the device they were saved from (usually cuda:0), only for
+        # them to be copied into the CPU parameters and moved to `device` again below
+        kwargs.setdefault("map_location", "cpu")
+
+        # Local checkpoints are memory-mapped so the tensors are paged in as the state dict is
+        # copied into the model instead of being read into memory up front. Anything Lightning
+        # has to resolve itself (remote URLs, file objects, hparams files) goes the usual way
+        model = None
+        if not args and "hparams_file" not in kwargs and _is_local_file(checkpoint_path):
+            model = cls._load_from_mmap_checkpoint(checkpoint_path, **kwargs)
+
+        if model is None:
+            model = super().load_from_checkpoint(checkpoint_path, *args, **kwargs)
+
+        # Cast on CPU first so the device transfer only moves the smaller weights
+        if torch_dtype is not None:
+            model = model.to(dtype=torch_dtype)
 
         # Move model to specified device
         model = model.to(device)
 
+        if compile:
+            # Compile the encoder in place rather than wrapping the module, so
+            # `embed`, `embed_sequences` and training steps all go through it
+            model.model.model.compile(mode=compile if isinstance(compile, str) else "reduce-overhead")
+
         return model
 
+    @classmethod
+    def _load_from_mmap_checkpoint(
+        cls,
+        checkpoint_path: str | os.PathLike,
+        map_location: str | torch.device | None = None,
+        strict: bool | None = None,
+        weights_only: bool | None = None,
+        **kwargs,
+    ) -> "UME | None":
+        """Mirror of Lightning's `load_from_checkpoint` that loads a local checkpoint with `mmap=True`.
+
+        Lightning opens checkpoints through fsspec and hands `torch.load` a file object, which
+        cannot be memory-mapped, so the file is loaded here by path and the result is passed to
+        Lightning's own state restoration. That relies on private Lightning helpers, so None is
+        returned if they can't be imported and the caller falls back to the regular loader.
+        """
+        try:
+            from lightning.pytorch.core.saving import _load_state
+            from lightning.pytorch.utilities.migration import pl_legacy_patch
+            from lightning.pytorch.utilities.migration.utils import _pl_migrate_checkpoint
+        except (ImportError, AttributeError):
+            return None
+
+        with pl_legacy_patch():
+            checkpoint = torch.load(checkpoint_path, map_location=map_location, weights_only=weights_only, mmap=True)
+
+        checkpoint = _pl_migrate_checkpoint(checkpoint, checkpoint_path=checkpoint_path)
+
+        # Keep the overrides in the restored hyperparameters, like Lightning does
+        checkpoint.setdefault(cls.CHECKPOINT_HYPER_PARAMS_KEY, {}).update(kwargs)
+
+        if not checkpoint["state_dict"]:
+            rank_zero_warn(f"The state dict in {checkpoint_path!r} contains no parameters.")
+
+        return _load_state(cls, checkpoint, strict=strict, **kwargs)
+
     @classmethod
     def from_pretrained(
         cls,
@@ -967,6 +1259,8 @@ class UME(L.LightningModule):
         device: str | None = None,
         use_flash_attn: bool | None = None,
         cache_dir: str | None = None,
+        torch_dtype: torch.dtype | None = None,
+        compile: bool | str = False,
         **kwargs,
     ) -> "UME":
         """Load a pretrained UME model from a model name.
@@ -992,13 +1286,22 @@ class UME(L.LightningModule):
             Whether to use flash attention. If None, will be determined based on device.
         cache_dir : str | None, optional
             Directory to cache downloaded models. If None, uses 'models/ume' in current directory.
+        torch_dtype : torch.dtype | None, optional
+            Dtype to cast the model's floating point weights to before moving it to `device`,
+            e.g. `torch.bfloat16` for half-precision inference. If None, keeps the checkpoint's dtype.
+        compile : bool | str, optional
+            Whether to compile the encoder with `torch.compile`. A string is used as the compile
+            mode, True means "reduce-overhead". The first forward pass for each new input shape
+            pays the compilation cost. Default is False.
         **kwargs
             Additional keyword arguments to pass to load_from_checkpoint.
 
         Returns
         -------
         UME
-            The loaded pretrained model.
+            The loaded pretrained model. Repeated calls with the same arguments return the same
+            instance for as long as it is referenced elsewhere, so changes made to it (e.g.
+            `freeze`) are visible to every caller. Use `clear_cache` to force a reload.
 
         Examples
         --------
@@ -1010,37 +1313,63 @@ class UME(L.LightningModule):
         >>>
         >>> # Load with custom cache directory
         >>> model = UME.from_pretrained("ume-mini-base-12M", cache_dir="/path/to/cache")
+        >>>
+        >>> # Load in bf16 and compile the encoder for inference
+        >>> model = UME.from_pretrained("ume-mini-base-12M", torch_dtype=torch.bfloat16, compile=True)
         """
 
-        # Warning that you're using pre-release checkpoints which
-        # are just placeholder checkpoints for now.
-        warnings.warn(
-            "You're using pre-release UME checkpoints which are just placeholder checkpoints for now. Stay tuned for UME release.",
-            stacklevel=2,
-        )
+        _warn_prerelease_checkpoints()
+
+        # Determine cache directory
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getcwd(), "models", "ume")
+
+        try:
+            cache_key = (
+                model_name,
+                device,
+                use_flash_attn,
+                cache_dir,
+                torch_dtype,
+                compile,
+                tuple(sorted(kwargs.items())),
+            )
+            model = cls._pretrained_models.get(cache_key)
+        except TypeError:  # unhashable kwargs, don't cache
+            cache_key = model = None
+
+        if model is not None:
+            return model
+
         checkpoint_dict = get_ume_checkpoints()
 
         checkpoint_path = checkpoint_dict.get(model_name)
         if checkpoint_path is None:
-            available_models = [
-                model_name for model_name in checkpoint_dict.keys() if checkpoint_dict[model_name] is not None
-            ]
+            available_models = [name for name, path in checkpoint_dict.items() if path is not None]
             raise ValueError(f"Unknown model name: {model_name}. Currently available models: {available_models}")
 
-        # Determine cache directory
-        if cache_dir is None:
-            cache_dir = os.path.join(os.getcwd(), "models", "ume")
-
         local_filename = f"{model_name}.ckpt"
 
         # Load the model with automatic retry on corruption
         # happens if previous download was stopped, for example
-        return load_checkpoint_with_retry(
+        model = load_checkpoint_with_retry(
             checkpoint_path=checkpoint_path,
             local_directory=cache_dir,
             local_filename=local_filename,
             load_func=cls.load_from_checkpoint,
             device=device,
             use_flash_attn=use_flash_attn,
+            torch_dtype=torch_dtype,
+            compile=compile,
             **kwargs,
         )
+
+        if cache_key is not None:
+            cls._pretrained_models[cache_key] = model
+
+        return model
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Forget the models returned by `from_pretrained` so the next call reloads them."""
+        cls._pretrained_models.clear()
@@ -1,9 +1,11 @@
+import functools
 import json
 import logging
 import os
 from collections.abc import Callable
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, CredentialRetrievalError, NoCredentialsError
 
 from lobster.constants import UME_CHECKPOINT_DICT_S3_BUCKET, UME_CHECKPOINT_DICT_S3_KEY
@@ -11,9 +13,22 @@ from lobster.data._utils import download_from_s3
 
 logger = logging.getLogger(__name__)
 
+# Checkpoints are hundreds of MB to several GB, so fetch them as 16 concurrent 64 MB range
+# requests instead of boto3's default of 10 x 8 MB parts
+CHECKPOINT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024**2,
+    multipart_chunksize=64 * 1024**2,
+    max_concurrency=16,
+)
 
+
+@functools.cache
 def get_ume_checkpoints() -> dict[str, str]:
-    """Get the UME checkpoints from S3."""
+    """Get the UME checkpoints from S3.
+
+    The registry is only fetched once per process, use `get_ume_checkpoints.cache_clear()`
+    to pick up changes made since.
+    """
     client = boto3.client("s3")
     response = client.get_object(Bucket=UME_CHECKPOINT_DICT_S3_BUCKET, Key=UME_CHECKPOINT_DICT_S3_KEY)
     decoded_body = response["Body"].read().decode("utf-8")
@@ -54,7 +69,7 @@ def _download_checkpoint(checkpoint_path: str, local_path: str, local_filename:
 
         logger.info(f"Downloading checkpoint to {local_path}")
 
-        download_from_s3(checkpoint_path, local_path)
+        download_from_s3(checkpoint_path, local_path, transfer_config=CHECKPOINT_TRANSFER_CONFIG)
 
         logger.info("Successfully downloaded model checkpoint.")
 
@@ -1,6 +1,7 @@
 """Loss functions for contrastive learning."""
 
 from ._infonce_loss import InfoNCELoss
+from ._siglip_loss import SigLIPLoss
 from ._symile_loss import SymileLoss
 
-__all__ = ["InfoNCELoss", "SymileLoss"]
+__all__ = ["InfoNCELoss", "SigLIPLoss", "SymileLoss"]
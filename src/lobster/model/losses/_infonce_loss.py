@@ -66,7 +66,8 @@ class InfoNCELoss(nn.Module):
         Tensor
             InfoNCE loss
         """
-        # Gather embeddings from all GPUs using DisCo-CLIP
+        # Gather embeddings from all GPUs using DisCo-CLIP. The backward pass all-reduces
+        # the gradients of the gathered columns, so each rank only needs its own rows
         all_embeddings_a = Gather(embeddings_a)
         all_embeddings_b = Gather(embeddings_b)
 
@@ -74,19 +75,10 @@ class InfoNCELoss(nn.Module):
         local_batch_size = embeddings_a.shape[0]
         rank = get_rank()
 
-        # Compute local similarities using DisCo-CLIP approach with slicing
-        # This is more memory-efficient: we only compute (local_batch x total_batch)
+        # Compute only the (local_batch x total_batch) block of the similarity matrix
         # instead of (total_batch x total_batch)
-        logits_a = (
-            all_embeddings_a[local_batch_size * rank : local_batch_size * (rank + 1)]
-            @ all_embeddings_b.T
-            / self.temperature
-        )
-        logits_b = (
-            all_embeddings_b[local_batch_size * rank : local_batch_size * (rank + 1)]
-            @ all_embeddings_a.T
-            / self.temperature
-        )
+        logits_a = embeddings_a @ all_embeddings_b.T / self.temperature
+        logits_b = embeddings_b @ all_embeddings_a.T / self.temperature
 
         # Create labels - positive pairs are at positions offset by rank * local_batch_size
         labels = torch.arange(local_batch_size, device=embeddings_a.device) + rank * local_batch_size
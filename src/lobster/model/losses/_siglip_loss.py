@@ -0,0 +1,62 @@
+"""Sigmoid loss for language-image pre-training (SigLIP).
+
+Reference:
+    @inproceedings{zhai2023sigmoid,
+    title = {Sigmoid Loss for Language Image Pre-Training},
+    author = {Zhai, Xiaohua and Mustafa, Basil and Kolesnikov, Alexander and Beyer, Lucas},
+    booktitle = {Proceedings of the IEEE/CVF International Conference on Computer Vision (ICCV)},
+    year = {2023}
+    }
+"""
+
+import math
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch import Tensor
+
+
+class SigLIPLoss(nn.Module):
+    """Pairwise sigmoid loss for contrastive learning with two views.
+
+    Every (a, b) pair in the batch is treated as an independent binary classification:
+    matching pairs on the diagonal are positives and all other pairs are negatives.
+    Unlike InfoNCE there is no softmax normalizer over the batch, so the loss of a pair
+    does not depend on the global batch.
+
+    Parameters
+    ----------
+    logit_scale : float, default=log(10)
+        Initial value of the learnable log temperature. Logits are scaled by exp(logit_scale).
+    logit_bias : float, default=-10.0
+        Initial value of the learnable logit bias, which offsets the heavy imbalance
+        between positive and negative pairs at the start of training.
+    """
+
+    def __init__(self, logit_scale: float = math.log(10), logit_bias: float = -10.0) -> None:
+        super().__init__()
+        self.logit_scale = nn.Parameter(torch.tensor(logit_scale))
+        self.logit_bias = nn.Parameter(torch.tensor(logit_bias))
+
+    def forward(self, embeddings_a: Tensor, embeddings_b: Tensor) -> Tensor:
+        """Compute the sigmoid loss between two sets of embeddings.
+
+        Parameters
+        ----------
+        embeddings_a : Tensor
+            First set of normalized embeddings, shape (batch_size, hidden_size)
+        embeddings_b : Tensor
+            Second set of normalized embeddings, shape (batch_size, hidden_size)
+
+        Returns
+        -------
+        Tensor
+            Sigmoid loss, summed over all pairs and averaged over the batch
+        """
+        logits = self.logit_scale.exp() * embeddings_a @ embeddings_b.T + self.logit_bias
+
+        # +1 for matching pairs on the diagonal, -1 for all other pairs
+        labels = 2 * torch.eye(embeddings_a.shape[0], device=logits.device, dtype=logits.dtype) - 1
+
+        return -F.logsigmoid(labels * logits).sum() / embeddings_a.shape[0]
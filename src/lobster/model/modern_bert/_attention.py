@@ -19,6 +19,7 @@ from typing import Optional
 import importlib.metadata
 import logging
 import math
+import weakref
 
 from ._padding import pad_input, unpad_input_only, index_first_axis
 from ._config import FlexBertConfig, maybe_add_padding
@@ -56,6 +57,88 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+_sdpa_varlen_cache = None
+
+
+def _sdpa_varlen_indices(
+    cu_seqlens: torch.Tensor, max_seqlen: int, total_nnz: int
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Scatter/gather indices and key padding mask used by `sdpa_varlen`.
+
+    They only depend on `cu_seqlens`, so the result for the last `cu_seqlens` tensor is kept and reused
+    by the remaining layers of the forward pass. Under torch.compile they're recomputed instead, and the
+    compiler deduplicates them.
+
+    Returns:
+        seq_ids: (total_nnz,), positions: (total_nnz,), key_padding_mask: (batch, max_seqlen)
+    """
+    global _sdpa_varlen_cache
+
+    compiling = torch.compiler.is_compiling()
+    # Inference tensors have no version counter
+    version = None if cu_seqlens.is_inference() else cu_seqlens._version
+    key = (version, max_seqlen, total_nnz, torch.is_inference_mode_enabled())
+
+    if not compiling and _sdpa_varlen_cache is not None:
+        cached_ref, cached_key, cached_indices = _sdpa_varlen_cache
+        if cached_ref() is cu_seqlens and cached_key == key:
+            return cached_indices
+
+    batch = cu_seqlens.shape[0] - 1
+    seqlens = cu_seqlens.diff()
+
+    seq_ids = torch.repeat_interleave(torch.arange(batch, device=cu_seqlens.device), seqlens, output_size=total_nnz)
+    positions = torch.arange(total_nnz, device=cu_seqlens.device) - cu_seqlens[seq_ids]
+    key_padding_mask = torch.arange(max_seqlen, device=cu_seqlens.device)[None, :] < seqlens[:, None]
+
+    indices = (seq_ids, positions, key_padding_mask)
+    if not compiling:
+        _sdpa_varlen_cache = (weakref.ref(cu_seqlens), key, indices)
+
+    return indices
+
+
+def sdpa_varlen(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    cu_seqlens: torch.Tensor,
+    max_seqlen: int,
+    dropout_p: float = 0.0,
+) -> torch.Tensor:
+    """PyTorch SDPA over a batch of unpadded sequences.
+
+    Scatters the unpadded q, k, v into per-sequence padded tensors and masks the padded keys, so that
+    each token only attends within its own sequence, like `flash_attn_varlen_qkvpacked_func`.
+
+    Args:
+        q, k, v: (total_nnz, nheads, headdim)
+        cu_seqlens: (batch + 1,)
+        max_seqlen: int, upper bound on the sequence lengths in `cu_seqlens`
+
+    Returns:
+        attention: (total_nnz, nheads, headdim)
+    """
+    seq_ids, positions, key_padding_mask = _sdpa_varlen_indices(cu_seqlens, max_seqlen, q.shape[0])
+    batch = key_padding_mask.shape[0]
+
+    def _pad(x: torch.Tensor) -> torch.Tensor:
+        padded = x.new_zeros(batch, max_seqlen, *x.shape[1:])
+        padded[seq_ids, positions] = x
+        return padded.transpose(1, 2)  # (batch, nheads, max_seqlen, headdim)
+
+    attn = F.scaled_dot_product_attention(
+        _pad(q),
+        _pad(k),
+        _pad(v),
+        attn_mask=key_padding_mask[:, None, None, :],
+        dropout_p=dropout_p,
+        is_causal=False,
+    )
+
+    return attn.transpose(1, 2)[seq_ids, positions]
+
+
 class BertAlibiUnpadSelfAttention(nn.Module):
     """Performs multi-headed self attention on a batch of unpadded sequences.
 
@@ -328,17 +411,12 @@ class FlexBertUnpadAttention(FlexBertAttentionBase):
             )
             self.use_fa2 = False
         if not self.use_fa2:
-            if not self.use_sdpa_attn_mask:
-                logger.warn_once(
-                    "SDPA attention is being used without an attention mask. Including padding in the "
-                    " attention calculation may cause differences from the Flash Attention implementation."
-                )
-            else:
-                logger.warn_once(
-                    "SDPA attention with an attention mask doesn't use the Flash Attention kernel and will"
-                    " use more memory during the backward pass. Use the FA2 backend for linear memory scaling"
-                    " with sequence length."
-                )
+            # sdpa_varlen always masks the padding, regardless of use_sdpa_attn_mask
+            logger.warn_once(
+                "SDPA attention with an attention mask doesn't use the Flash Attention kernel and will"
+                " use more memory during the backward pass. Use the FA2 backend for linear memory scaling"
+                " with sequence length."
+            )
             if self.sliding_window[0] > 0:
                 raise ValueError("Sliding window is not implemented for the PyTorch SDPA path. Use the FA2 backend.")
 
@@ -419,26 +497,10 @@ class FlexBertUnpadAttention(FlexBertAttentionBase):
             # attn = attn.view(bs, dim)
             attn = attn.reshape(bs, dim)
         else:
-            # Use native unpadded SDPA without padding/unpadding
-            # This ensures consistent processing regardless of flash attention availability
+            # Pad each sequence inside the attention only, so tokens never attend across sequences
             qkv = qkv.view(-1, 3, self.num_attention_heads, self.attn_head_size)
             q, k, v = qkv.unbind(dim=1)  # Each has shape (total_nnz, num_heads, head_dim)
-            
-            # Reshape for SDPA: (num_heads, total_nnz, head_dim)
-            q = q.transpose(0, 1)
-            k = k.transpose(0, 1)
-            v = v.transpose(0, 1)
-            
-            # Apply dropout if needed
-            if self.p_dropout > 0.0:
-                attn = F.scaled_dot_product_attention(
-                    q, k, v, dropout_p=self.p_dropout
-                )
-            else:
-                attn = F.scaled_dot_product_attention(q, k, v)
-            
-            # Reshape back: (total_nnz, num_heads, head_dim)
-            attn = attn.transpose(0, 1)
+            attn = sdpa_varlen(q, k, v, cu_seqlens, max_seqlen, dropout_p=self.p_dropout if self.training else 0.0)
             attn = attn.reshape(bs, dim)
 
         return self.out_drop(self.Wo(attn))
@@ -492,17 +554,12 @@ class FlexBertUnpadParallelAttention(FlexBertAttentionBase):
             )
             self.use_fa2 = False
         if not self.use_fa2:
-            if not self.use_sdpa_attn_mask:
-                logger.warn_once(
-                    "SDPA attention is being used without an attention mask. Including padding in the "
-                    " attention calculation may cause differences from the Flash Attention implementation."
-                )
-            else:
-                logger.warn_once(
-                    "SDPA attention with an attention mask doesn't use the Flash Attention kernel and will"
-                    " use more memory during the backward pass. Use the FA2 backend for linear memory scaling"
-                    " with sequence length."
-                )
+            # sdpa_varlen always masks the padding, regardless of use_sdpa_attn_mask
+            logger.warn_once(
+                "SDPA attention with an attention mask doesn't use the Flash Attention kernel and will"
+                " use more memory during the backward pass. Use the FA2 backend for linear memory scaling"
+                " with sequence length."
+            )
             if self.sliding_window[0] > 0:
                 raise ValueError("Sliding window is not implemented for the PyTorch SDPA path. Use the FA2 backend.")
 
@@ -574,26 +631,10 @@ class FlexBertUnpadParallelAttention(FlexBertAttentionBase):
                 )
             attn = attn.view(bs, dim)
         else:
-            # Use native unpadded SDPA without padding/unpadding
-            # This ensures consistent processing regardless of flash attention availability
+            # Pad each sequence inside the attention only, so tokens never attend across sequences
             qkv = qkv.view(-1, 3, self.num_attention_heads, self.attn_head_size)
             q, k, v = qkv.unbind(dim=1)  # Each has shape (total_nnz, num_heads, head_dim)
-            
-            # Reshape for SDPA: (num_heads, total_nnz, head_dim)
-            q = q.transpose(0, 1)
-            k = k.transpose(0, 1)
-            v = v.transpose(0, 1)
-            
-            # Apply dropout if needed
-            if self.p_dropout > 0.0:
-                attn = F.scaled_dot_product_attention(
-                    q, k, v, dropout_p=self.p_dropout
-                )
-            else:
-                attn = F.scaled_dot_product_attention(q, k, v)
-            
-            # Reshape back: (total_nnz, num_heads, head_dim)
-            attn = attn.transpose(0, 1)
+            attn = sdpa_varlen(q, k, v, cu_seqlens, max_seqlen, dropout_p=self.p_dropout if self.training else 0.0)
             attn = attn.reshape(bs, dim)
 
         return self.out_drop(self.Wo(attn.view(bs, dim)))
@@ -19,6 +19,7 @@ from typing import Optional, Union, List
 
 import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
 
 from ._padding import unpad_input, pad_input
 
@@ -597,6 +598,13 @@ class FlexBertEncoderBase(nn.Module):
     """A FlexBERT base class for type hints."""
 
     layers: nn.ModuleList
+    gradient_checkpointing: bool = False
+
+    def _layer_forward(self, layer_module: nn.Module, hidden_states: torch.Tensor, *args, **kwargs) -> torch.Tensor:
+        # Per-layer activation checkpointing: only the layer inputs are kept, activations are recomputed in backward
+        if self.gradient_checkpointing and self.training:
+            return checkpoint(layer_module, hidden_states, *args, use_reentrant=False, **kwargs)
+        return layer_module(hidden_states, *args, **kwargs)
 
     def _init_weights(self, reset_params: bool = False):
         if hasattr(self, "layers"):
@@ -641,7 +649,8 @@ class FlexBertUnpadEncoder(FlexBertEncoderBase):
             )
 
             for layer_module in self.layers:
-                hidden_states = layer_module(
+                hidden_states = self._layer_forward(
+                    layer_module,
                     hidden_states,
                     cu_seqlens,
                     max_seqlen,
@@ -652,7 +661,8 @@ class FlexBertUnpadEncoder(FlexBertEncoderBase):
             return pad_input(hidden_states, indices, batch, seqlen)
         else:
             for layer_module in self.layers:
-                hidden_states = layer_module(
+                hidden_states = self._layer_forward(
+                    layer_module,
                     hidden_states,
                     cu_seqlens,
                     max_seqlen,
@@ -679,7 +689,7 @@ class FlexBertPaddedEncoder(FlexBertEncoderBase):
 
     def forward(self, hidden_states: torch.Tensor, attention_mask: torch.Tensor, **kwargs) -> torch.Tensor:
         for layer_module in self.layers:
-            hidden_states = layer_module(hidden_states, attn_mask=attention_mask)
+            hidden_states = self._layer_forward(layer_module, hidden_states, attn_mask=attention_mask)
 
         return hidden_states
 
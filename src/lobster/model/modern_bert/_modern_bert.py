@@ -9,6 +9,7 @@ from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast, get_sched
 from ._config import FlexBertConfig
 from ._model import FlexBertModel, FlexBertPredictionHead
 from ._modern_bert_configuration import FLEXBERT_CONFIG_ARGS
+from ._padding import unpad_input
 from lobster.constants import SchedulerType
 
 _FLASH_ATTN_AVAILABLE = False
@@ -149,6 +150,14 @@ class FlexBERT(pl.LightningModule):
             self.cls_token_id = cls_token_id
             self.eos_token_id = eos_token_id
 
+    def gradient_checkpointing_enable(self) -> None:
+        """Recompute each encoder layer's activations during backward instead of storing them."""
+        self.model.encoder.gradient_checkpointing = True
+
+    def gradient_checkpointing_disable(self) -> None:
+        """Store encoder activations for backward (default)."""
+        self.model.encoder.gradient_checkpointing = False
+
     def training_step(self, batch, batch_idx):
         loss = self._compute_loss(batch)
         ppl = torch.exp(loss)
@@ -186,22 +195,18 @@ class FlexBERT(pl.LightningModule):
     def _prepare_inputs(self, input_ids: torch.Tensor, attention_mask: torch.Tensor
                         ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
         """Prepare inputs for the model by reshaping and calculating cumulative sequence lengths.
-        Expects input_ids and attention_mask to be of shape (batch_size, 1, length).
+        Expects input_ids and attention_mask to be of shape (batch_size, length) or (batch_size, 1, length).
         Returns reshaped input_ids and attention_mask of shape (batch_size * sequence_length,)
         and cumulative sequence lengths of shape (batch_size + 1,).
         """
         # Compute cumulative sequence lengths
-        # input_ids and attention_mask are expected to be of shape (batch_size, 1, length)
-        batch_size, length = input_ids.shape[0], input_ids.shape[2]
+        batch_size, length = input_ids.shape[0], input_ids.shape[-1]
         cu_seqlens = torch.tensor([0] + [(i + 1) * length for i in range(batch_size)], dtype=torch.int32, device=self.device)
 
-        # remove the middle dimension
-        input_ids = input_ids.squeeze(1)
-        attention_mask = attention_mask.squeeze(1)
-
-        # flatten to (batch_size * sequence_length)
-        input_ids = input_ids.view(-1)  
-        attention_mask = attention_mask.view(-1)
+        # flatten to (batch_size * sequence_length); inputs may be non-contiguous
+        # views into a multi-view batch, so reshape only copies when it has to
+        input_ids = input_ids.reshape(-1)
+        attention_mask = attention_mask.reshape(-1)
 
         assert (
             input_ids.max() < self.config.vocab_size
@@ -209,6 +214,26 @@ class FlexBERT(pl.LightningModule):
         
         return input_ids, attention_mask, cu_seqlens
 
+    def _unpad_inputs(self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+                      ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, int, torch.Tensor]:
+        """Remove padding tokens from the inputs once, before the encoder.
+        Expects input_ids and attention_mask to be of shape (batch_size, length) or (batch_size, 1, length).
+        Returns input_ids of shape (total_nnz,), the flat indices of the kept tokens of shape (total_nnz,),
+        cumulative sequence lengths of shape (batch_size + 1,), the maximum sequence length in the batch
+        and the position of each kept token in its padded sequence of shape (total_nnz,).
+        """
+        if input_ids.dim() == 3:
+            input_ids = input_ids.squeeze(1)
+        if attention_mask.dim() == 3:
+            attention_mask = attention_mask.squeeze(1)
+
+        input_ids, indices, cu_seqlens, max_seqlen = unpad_input(input_ids.unsqueeze(-1), attention_mask.bool())
+
+        # Computed here so the encoder doesn't build position ids with a per-sequence loop from cu_seqlens
+        position_ids = indices % attention_mask.shape[-1]
+
+        return input_ids.squeeze(-1), indices, cu_seqlens, max_seqlen, position_ids
+
     def _mask_inputs(self, input_ids: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
         """Mask inpust with random masking."""
         # create random array of floats with equal dimensions to input_ids tensor
@@ -218,16 +243,14 @@ class FlexBERT(pl.LightningModule):
         # TODO: update this for special cls tokens that might be introduced with the new tokenizer
         mask_arr = (
             (rand < self._mask_percentage)
-            * (input_ids != self.cls_token_id)
-            * (input_ids != self.pad_token_id)
-            * (input_ids != self.eos_token_id)
+            & (input_ids != self.cls_token_id)
+            & (input_ids != self.pad_token_id)
+            & (input_ids != self.eos_token_id)
         )  # don't mask cls, pad, eos
 
-        masked_inputs = input_ids.clone()
-        masked_inputs[mask_arr] = self.mask_token_id
-
-        labels  = input_ids.clone()
-        labels[~mask_arr] = -100  # set unmasked tokens to -100 for loss calculation
+        # torch.where instead of boolean-mask assignment, which forces a device sync
+        masked_inputs = torch.where(mask_arr, self.mask_token_id, input_ids)
+        labels = torch.where(mask_arr, input_ids, -100)  # set unmasked tokens to -100 for loss calculation
 
         return masked_inputs, labels
 
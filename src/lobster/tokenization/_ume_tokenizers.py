@@ -41,10 +41,13 @@ To create the tokenizers, run
 ```
 """
 
+import copy
 import importlib.resources
 import warnings
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Literal
+from typing import ClassVar, Literal
 
 from tokenizers import Regex
 from tokenizers.models import BPE, WordLevel
@@ -391,6 +394,13 @@ class UMENucleotideTokenizerFast(PreTrainedTokenizerFast):
         )
 
 
+_TOKENIZER_CLASSES: dict[Modality, type[PreTrainedTokenizerFast]] = {
+    Modality.AMINO_ACID: UMEAminoAcidTokenizerFast,
+    Modality.SMILES: UMESmilesTokenizerFast,
+    Modality.NUCLEOTIDE: UMENucleotideTokenizerFast,
+}
+
+
 class UMETokenizerTransform(Module):
     """
     UME tokenizer transform for single modality inputs.
@@ -423,8 +433,18 @@ class UMETokenizerTransform(Module):
         Add special tokens. Default True.
     padding : str, optional
         Padding strategy. Default "max_length".
+
+    Notes
+    -----
+    Tokenizers don't depend on `max_length` or the other options here, so each modality's
+    tokenizer is loaded once and every transform lazily takes its own copy of it. Fast
+    tokenizers store truncation and padding on their backend before every encode, so
+    transforms with different settings must not share one. As before, a single transform
+    is not meant to be called from several threads at once.
     """
 
+    _tokenizers: ClassVar[dict[Modality, PreTrainedTokenizerFast]] = {}
+
     def __init__(
         self,
         modality: ModalityType | Literal["amino_acid", "smiles", "nucleotide"],
@@ -450,28 +470,83 @@ class UMETokenizerTransform(Module):
         self.seed = seed
 
         self.modality = Modality(modality) if isinstance(modality, str) else modality
+        self._tokenizer: PreTrainedTokenizerFast | None = None
 
-        modality = Modality(modality) if isinstance(modality, str) else modality
+    @classmethod
+    def _load_tokenizer(cls, modality: Modality) -> PreTrainedTokenizerFast:
+        """Return the cached tokenizer for `modality`, loading it on first use."""
+        if modality not in cls._tokenizers:
+            if modality not in _TOKENIZER_CLASSES:
+                raise ValueError(f"No UME tokenizer for modality {modality}")
 
-        match modality:
-            case Modality.AMINO_ACID:
-                self.tokenizer = UMEAminoAcidTokenizerFast()
-            case Modality.SMILES:
-                self.tokenizer = UMESmilesTokenizerFast()
-            case Modality.NUCLEOTIDE:
-                self.tokenizer = UMENucleotideTokenizerFast()
+            cls._tokenizers[modality] = _TOKENIZER_CLASSES[modality]()
 
-    def _encode(self, item: str | list[str]) -> dict[str, Tensor]:
-        """Tokenize and encode input."""
+        return cls._tokenizers[modality]
+
+    @classmethod
+    def batch_load(cls, modalities: Iterable[ModalityType | Modality]) -> None:
+        """
+        Load the tokenizers for several modalities in parallel.
+
+        Parameters
+        ----------
+        modalities : Iterable[ModalityType | Modality]
+            Modalities to load tokenizers for. Already loaded tokenizers are skipped.
+        """
+        pending = {Modality(modality) for modality in modalities} - cls._tokenizers.keys()
+
+        if len(pending) < 2:
+            for modality in pending:
+                cls._load_tokenizer(modality)
+            return
+
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            list(executor.map(cls._load_tokenizer, pending))
+
+    @property
+    def tokenizer(self) -> PreTrainedTokenizerFast:
+        if self._tokenizer is None:
+            self._tokenizer = copy.deepcopy(self._load_tokenizer(self.modality))
+
+        return self._tokenizer
+
+    def _tokenize(self, items: str | list[str], padding: str | bool) -> dict[str, Tensor]:
+        """Run the tokenizer with this transform's settings."""
         return self.tokenizer(
-            item,
+            items,
             max_length=self.max_length,
-            padding=self.padding if self.max_length else False,
+            padding=padding,
             truncation=True if self.max_length else False,
             add_special_tokens=self.add_special_tokens,
             return_tensors="pt",
         )
 
+    def _encode(self, item: str | list[str]) -> dict[str, Tensor]:
+        """Tokenize and encode input."""
+        return self._tokenize(item, padding=self.padding if self.max_length else False)
+
+    def batch_encode(self, items: Sequence[str], padding: str = "longest") -> dict[str, Tensor]:
+        """
+        Tokenize a batch of inputs with a single tokenizer call.
+
+        Unlike `forward`, the batch is only padded to its longest sequence
+        (still truncated to `max_length`) by default.
+
+        Parameters
+        ----------
+        items : Sequence[str]
+            Inputs to tokenize. Example: ["MYK", "AVYK"]
+        padding : str, optional
+            Padding strategy. Default "longest".
+
+        Returns
+        -------
+        dict
+            Tokenized output with keys "input_ids" and "attention_mask",
+            each of shape (batch_size, length).
+        """
+        return self._tokenize(list(items), padding=padding)
+
     def forward(
         self,
         item: str | list[str],
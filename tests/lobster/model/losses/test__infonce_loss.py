@@ -0,0 +1,63 @@
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from lobster.model.losses import InfoNCELoss
+
+WORLD_SIZE = 2
+LOCAL_BATCH_SIZE = 4
+HIDDEN_SIZE = 8
+
+
+def _check_disco_matches_full_batch(rank: int, port: int) -> None:
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=WORLD_SIZE)
+
+    try:
+        torch.manual_seed(0)
+        embeddings_a = torch.nn.functional.normalize(torch.randn(WORLD_SIZE * LOCAL_BATCH_SIZE, HIDDEN_SIZE), dim=-1)
+        embeddings_b = torch.nn.functional.normalize(torch.randn(WORLD_SIZE * LOCAL_BATCH_SIZE, HIDDEN_SIZE), dim=-1)
+        local = slice(rank * LOCAL_BATCH_SIZE, (rank + 1) * LOCAL_BATCH_SIZE)
+
+        full_a = embeddings_a.clone().requires_grad_()
+        full_b = embeddings_b.clone().requires_grad_()
+        expected_loss = InfoNCELoss(temperature=0.1)(full_a, full_b)
+        expected_loss.backward()
+
+        local_a = embeddings_a[local].clone().requires_grad_()
+        local_b = embeddings_b[local].clone().requires_grad_()
+        loss = InfoNCELoss(temperature=0.1, use_disco=True)(local_a, local_b)
+        loss.backward()
+
+        mean_loss = loss.detach().clone()
+        dist.all_reduce(mean_loss)
+        torch.testing.assert_close(mean_loss / WORLD_SIZE, expected_loss.detach())
+
+        # DDP averages parameter gradients over ranks, so the local gradients
+        # must be WORLD_SIZE times the full-batch gradients
+        torch.testing.assert_close(local_a.grad, WORLD_SIZE * full_a.grad[local])
+        torch.testing.assert_close(local_b.grad, WORLD_SIZE * full_b.grad[local])
+    finally:
+        dist.destroy_process_group()
+
+
+class TestInfoNCELoss:
+    def test_standard_loss(self):
+        torch.manual_seed(0)
+        embeddings = torch.nn.functional.normalize(torch.randn(4, HIDDEN_SIZE), dim=-1)
+
+        loss_fn = InfoNCELoss(temperature=0.07)
+
+        assert loss_fn(embeddings, embeddings) < loss_fn(embeddings, embeddings.roll(1, dims=0))
+
+    def test_disco_loss_matches_full_batch(self):
+        # Let the OS pick a free port so parallel test runs don't collide
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        mp.spawn(_check_disco_matches_full_batch, args=(port,), nprocs=WORLD_SIZE)
@@ -0,0 +1,33 @@
+import math
+
+import torch
+
+from lobster.model.losses import SigLIPLoss
+
+
+class TestSigLIPLoss:
+    def test_forward(self):
+        torch.manual_seed(0)
+        embeddings_a = torch.nn.functional.normalize(torch.randn(4, 8), dim=-1)
+        embeddings_b = torch.nn.functional.normalize(torch.randn(4, 8), dim=-1)
+
+        loss_fn = SigLIPLoss()
+        loss = loss_fn(embeddings_a, embeddings_b)
+
+        logits = 10 * embeddings_a @ embeddings_b.T - 10
+        expected = 0.0
+        for i in range(4):
+            for j in range(4):
+                label = 1.0 if i == j else -1.0
+                expected -= math.log(torch.sigmoid(label * logits[i, j]).item())
+
+        torch.testing.assert_close(loss, torch.tensor(expected / 4))
+
+    def test_learnable_parameters(self):
+        embeddings = torch.nn.functional.normalize(torch.randn(4, 8), dim=-1)
+
+        loss_fn = SigLIPLoss()
+        loss_fn(embeddings, embeddings).backward()
+
+        assert loss_fn.logit_scale.grad is not None
+        assert loss_fn.logit_bias.grad is not None
@@ -0,0 +1,32 @@
+import torch
+import torch.nn.functional as F
+
+from lobster.model.modern_bert._attention import _sdpa_varlen_indices, sdpa_varlen
+
+
+def test_sdpa_varlen_matches_per_sequence_attention():
+    torch.manual_seed(0)
+    seqlens = [3, 5, 1]
+    cu_seqlens = torch.tensor([0, 3, 8, 9], dtype=torch.int32)
+    q, k, v = torch.randn(3, 9, 2, 4).unbind(0)
+
+    attn = sdpa_varlen(q, k, v, cu_seqlens, max_seqlen=max(seqlens))
+
+    for start, end in zip(cu_seqlens[:-1].tolist(), cu_seqlens[1:].tolist()):
+        expected = F.scaled_dot_product_attention(*(x[start:end].transpose(0, 1) for x in (q, k, v)))
+        torch.testing.assert_close(attn[start:end], expected.transpose(0, 1))
+
+
+def test_sdpa_varlen_indices_reused_for_same_cu_seqlens():
+    cu_seqlens = torch.tensor([0, 3, 8, 9], dtype=torch.int32)
+
+    indices = _sdpa_varlen_indices(cu_seqlens, 5, 9)
+
+    # Every layer of a forward pass gets the indices computed by the first one
+    assert _sdpa_varlen_indices(cu_seqlens, 5, 9) is indices
+
+    # A new batch, even with equal lengths, gets its own
+    other = _sdpa_varlen_indices(cu_seqlens.clone(), 5, 9)
+    assert other is not indices
+    for a, b in zip(indices, other):
+        torch.testing.assert_close(a, b)
@@ -1,10 +1,15 @@
+import sys
+import warnings
 from unittest.mock import MagicMock, patch
 
+import lightning
 import pytest
 import torch
+from torchmetrics.text import Perplexity
 
 from lobster.constants import Modality
 from lobster.model import UME
+from lobster.model._ume import _fa2_available, _select_attn_backend, _warn_prerelease_checkpoints
 
 
 @pytest.fixture
@@ -46,12 +51,25 @@ class TestUME:
             assert ume.frozen is True
             assert not mock_param.requires_grad
             mock_model.eval.assert_called_once()
+            assert ume.inference_dtype == torch.bfloat16
+            assert ume._inference_autocast_dtype() is None  # only autocast on CUDA
+
+            with (
+                patch.object(UME, "device", torch.device("cuda", 1)),
+                patch("torch.cuda.get_device_capability", return_value=(7, 0)) as mock_capability,
+            ):
+                assert ume._inference_autocast_dtype() is None  # bf16 is only emulated before Ampere
+                mock_capability.assert_called_once_with(torch.device("cuda", 1))
+
+                mock_capability.return_value = (8, 0)
+                assert ume._inference_autocast_dtype() == torch.bfloat16
 
             # Test unfreeze
             ume.unfreeze()
             assert ume.frozen is False
             assert mock_param.requires_grad
             mock_model.train.assert_called_once()
+            assert ume.inference_dtype is None
 
     def test_embed_sequences(self, sample_sequences):
         with patch("lobster.model._ume.FlexBERT") as mock_flex_bert:
@@ -63,7 +81,7 @@ class TestUME:
                 torch.ones(1, 20),
                 torch.tensor([0, 10, 20]),
             )
-            mock_model.model.return_value = torch.randn(20, 768)
+            mock_model.model.return_value = torch.randn(2, 10, 768)
             mock_model.device = "cpu"
             mock_flex_bert.return_value = mock_model
 
@@ -84,7 +102,7 @@ class TestUME:
                 torch.ones(1, 20),
                 torch.tensor([0, 10, 20]),
             )
-            mock_model.model.return_value = torch.randn(20, 768)
+            mock_model.model.return_value = torch.randn(2, 10, 768)
             mock_model.device = torch.device("cpu")
             mock_flex_bert.return_value = mock_model
 
@@ -113,6 +131,7 @@ class TestUME:
             # Test with Modality enum
             tokenizer = ume.get_tokenizer(Modality.AMINO_ACID)
             assert tokenizer is not None
+            assert ume.get_tokenizer("amino_acid") is tokenizer
 
     def test_get_vocab(self):
         with patch("lobster.model._ume.FlexBERT", MagicMock()):
@@ -122,6 +141,10 @@ class TestUME:
             # Vocab should be non-empty
             assert len(vocab) > 0
 
+            # Vocab is built once and reused
+            assert ume.get_vocab() is vocab
+            assert ume._vocab_size == len(vocab)
+
     def test_modalities_property(self):
         with patch("lobster.model._ume.FlexBERT", MagicMock()):
             ume = UME()
@@ -142,41 +165,17 @@ class TestUME:
 
             # Test extracting first view
             view_0 = ume._extract_batch_components(batch, 0)
-            assert view_0["input_ids"].shape == (2, 1, 10)
-            assert view_0["attention_mask"].shape == (2, 1, 10)
+            assert view_0["input_ids"].shape == (2, 10)
+            assert view_0["attention_mask"].shape == (2, 10)
             assert view_0["modality"] == ["SMILES", "amino_acid"]
+            assert view_0["input_ids"].data_ptr() == batch["input_ids"].data_ptr()
 
             # Test extracting second view
             view_1 = ume._extract_batch_components(batch, 1)
-            assert view_1["input_ids"].shape == (2, 1, 10)
-            assert view_1["attention_mask"].shape == (2, 1, 10)
+            assert view_1["input_ids"].shape == (2, 10)
+            assert view_1["attention_mask"].shape == (2, 10)
             assert view_1["modality"] == ["amino_acid", "SMILES"]
 
-    def test_split_combined_batch(self):
-        with patch("lobster.model._ume.FlexBERT", MagicMock()):
-            ume = UME()
-
-            # Create a sample batch with 2 views
-            batch = {
-                "input_ids": torch.randint(0, 100, (2, 2, 10)),
-                "attention_mask": torch.ones(2, 2, 10),
-                "modality": [["SMILES", "amino_acid"], ["amino_acid", "SMILES"]],
-            }
-
-            # Split the batch
-            batches = ume._split_combined_batch(batch)
-            assert len(batches) == 2
-
-            # Check first view
-            assert batches[0]["input_ids"].shape == (2, 1, 10)
-            assert batches[0]["attention_mask"].shape == (2, 1, 10)
-            assert batches[0]["modality"] == ["SMILES", "amino_acid"]
-
-            # Check second view
-            assert batches[1]["input_ids"].shape == (2, 1, 10)
-            assert batches[1]["attention_mask"].shape == (2, 1, 10)
-            assert batches[1]["modality"] == ["amino_acid", "SMILES"]
-
     def test_compute_weighted_loss(self):
         with patch("lobster.model._ume.FlexBERT", MagicMock()):
             ume = UME(contrastive_loss_weight=0.5)
@@ -190,6 +189,159 @@ class TestUME:
             expected_loss = 0.5 * mlm_loss + 0.5 * contrastive_loss
             assert torch.allclose(total_loss, expected_loss)
 
+    @pytest.mark.parametrize(
+        "contrastive_loss_weight, expected_loss, mlm_calls, contrastive_calls",
+        [(0.0, 2.0, 1, 0), (1.0, 4.0, 0, 1), (0.5, 3.0, 1, 1)],
+    )
+    def test_compute_step_loss(self, contrastive_loss_weight, expected_loss, mlm_calls, contrastive_calls):
+        with patch("lobster.model._ume.FlexBERT", MagicMock()):
+            ume = UME(contrastive_loss_type="clip", contrastive_loss_weight=contrastive_loss_weight)
+            ume._compute_mlm_loss = MagicMock(return_value=torch.tensor(2.0))
+            compute_contrastive_loss = MagicMock(return_value=torch.tensor(4.0))
+
+            loss = ume._compute_step_loss(compute_contrastive_loss, mlm_batch={}, stage="train")
+
+            assert torch.allclose(loss, torch.tensor(expected_loss))
+            assert ume._compute_mlm_loss.call_count == mlm_calls
+            assert compute_contrastive_loss.call_count == contrastive_calls
+
+    def test_auto_attention_backend_does_not_probe_device(self):
+        with (
+            patch("lobster.model._ume.FlexBERT", MagicMock()),
+            patch("lobster.model._ume._fa2_available") as mock_fa2_available,
+        ):
+            ume = UME()
+
+            mock_fa2_available.assert_not_called()
+            assert ume.attention_backend in ("fa2", "sdpa")
+
+    def test_select_attn_backend(self):
+        assert _fa2_available("cpu") is False
+        assert _select_attn_backend("cpu") == "sdpa"
+
+        with patch("lobster.model._ume._fa2_available", return_value=True) as mock_fa2_available:
+            assert _select_attn_backend(torch.device("cuda", 1)) == "fa2"
+            mock_fa2_available.assert_called_once_with("cuda:1")
+
+        with patch("lobster.model._ume._fa2_available", return_value=False):
+            assert _select_attn_backend("cuda") == "sdpa"
+
+    def test_load_from_checkpoint_maps_to_cpu(self):
+        with patch("lightning.LightningModule.load_from_checkpoint") as mock_load:
+            UME.load_from_checkpoint("model.ckpt", device="cpu")
+
+            assert mock_load.call_args.kwargs["map_location"] == "cpu"
+            assert mock_load.call_args.kwargs["attention_backend"] == "sdpa"
+            mock_load.return_value.to.assert_called_once_with("cpu")
+            mock_load.return_value.to.return_value.model.model.compile.assert_not_called()
+
+            UME.load_from_checkpoint("model.ckpt", device="cpu", compile=True)
+            mock_load.return_value.to.return_value.model.model.compile.assert_called_once_with(mode="reduce-overhead")
+
+    def test_load_from_checkpoint_mmap(self, tmp_path):
+        ume = UME(model_name="UME_mini", max_length=16)
+        checkpoint_path = tmp_path / "model.ckpt"
+        torch.save(
+            {
+                "state_dict": ume.state_dict(),
+                "hyper_parameters": dict(ume.hparams),
+                "pytorch-lightning_version": lightning.__version__,
+            },
+            checkpoint_path,
+        )
+
+        with (
+            patch("torch.load", wraps=torch.load) as mock_torch_load,
+            patch("lightning.LightningModule.load_from_checkpoint") as mock_load,
+        ):
+            loaded = UME.load_from_checkpoint(str(checkpoint_path), device="cpu", max_length=32)
+
+            assert mock_torch_load.call_args.kwargs["mmap"] is True
+            mock_load.assert_not_called()
+
+        assert loaded.max_length == 32
+        for name, param in ume.state_dict().items():
+            assert torch.equal(loaded.state_dict()[name], param)
+
+        # Falls back to Lightning's loader if its private helpers move
+        with (
+            patch.dict(sys.modules, {"lightning.pytorch.utilities.migration.utils": None}),
+            patch("lightning.LightningModule.load_from_checkpoint") as mock_load,
+        ):
+            UME.load_from_checkpoint(str(checkpoint_path), device="cpu")
+
+            mock_load.assert_called_once()
+
+        loaded = UME.load_from_checkpoint(str(checkpoint_path), device="cpu", torch_dtype=torch.bfloat16)
+
+        assert all(param.dtype == torch.bfloat16 for param in loaded.parameters())
+        assert loaded.embed_sequences(["MKTVRQ", "ACD"], "amino_acid").dtype == torch.bfloat16
+
+    def test_log_step(self):
+        with patch("lobster.model._ume.FlexBERT", MagicMock()):
+            ume = UME(contrastive_loss_weight=0.5)
+            ume.log_dict = MagicMock()
+
+            loss = ume._compute_weighted_loss(torch.tensor(2.0), torch.tensor(4.0), "val")
+            ume._log_step(loss, "val")
+
+            ume.log_dict.assert_called_once()
+            step_logs = ume.log_dict.call_args.args[0]
+            assert set(step_logs) == {"mlm_val_loss", "contrastive_val_loss", "val_loss"}
+            assert ume.log_dict.call_args.kwargs["on_epoch"] is True
+            assert ume._step_logs == {}
+
+    def test_process_batch_for_modality_metrics(self):
+        with patch("lobster.model._ume.FlexBERT", MagicMock()):
+            ume = UME()
+
+            torch.manual_seed(0)
+            batch_size, seq_len, vocab_size = 3, 4, 8
+            logits = torch.randn(batch_size * seq_len, vocab_size)
+            labels = torch.randint(0, vocab_size, (batch_size * seq_len,))
+            modalities = ["SMILES", "amino_acid", "SMILES"]
+
+            ume._process_batch_for_modality_metrics(logits, labels, modalities, "train")
+
+            logits = logits.view(batch_size, seq_len, vocab_size)
+            labels = labels.view(batch_size, seq_len)
+
+            smiles = Perplexity(ignore_index=-100)(logits[[0, 2]], labels[[0, 2]])
+            amino_acid = Perplexity(ignore_index=-100)(logits[[1]], labels[[1]])
+
+            torch.testing.assert_close(ume.perplexities["train_SMILES"].compute(), smiles)
+            torch.testing.assert_close(ume.perplexities["train_amino_acid"].compute(), amino_acid)
+
+    def test_gradient_checkpointing(self):
+        torch.manual_seed(0)
+
+        ume = UME(model_name="UME_mini", max_length=16, use_flash_attn=False)
+        ume_ckpt = UME(model_name="UME_mini", max_length=16, use_flash_attn=False, gradient_checkpointing=True)
+        ume_ckpt.load_state_dict(ume.state_dict())
+
+        assert ume_ckpt.model.model.encoder.gradient_checkpointing is True
+        assert ume.model.model.encoder.gradient_checkpointing is False
+
+        # Disable dropout so that both forwards are deterministic
+        for model in (ume, ume_ckpt):
+            for module in model.modules():
+                if isinstance(module, torch.nn.Dropout):
+                    module.p = 0.0
+
+        batch = ume.get_tokenizer("amino_acid")(
+            ["MKTVRQERLK", "ACD"], padding="max_length", max_length=16, return_tensors="pt"
+        )
+
+        grads = []
+        for model in (ume, ume_ckpt):
+            model.embed(dict(batch)).sum().backward()
+            grads.append(model.model.model.encoder.layers[0].attn.Wqkv.weight.grad)
+
+        torch.testing.assert_close(grads[0], grads[1])
+
+        ume_ckpt.gradient_checkpointing_disable()
+        assert ume_ckpt.model.model.encoder.gradient_checkpointing is False
+
     def test_embed_sequences_cpu(self):
         """Test UME's embed_sequences method without flash-attn on CPU."""
         # Initialize UME with a small model and flash-attn disabled
@@ -221,6 +373,145 @@ class TestUME:
             assert embeddings.dim() == 2  # [batch_size, hidden_size]
             assert embeddings.shape[0] == len(sequences)
 
+    def test_embed_unpadded_matches_encoder(self):
+        """Unpadding once around the encoder must match the encoder's internal unpad/re-pad path."""
+        torch.manual_seed(0)
+
+        ume = UME(model_name="UME_mini", max_length=16, use_flash_attn=False)
+        ume.eval()
+
+        assert ume.model.config.padding == "unpadded"
+
+        tokenizer = ume.get_tokenizer("amino_acid")
+        batch = tokenizer(
+            ["MKTVRQERLKSIVRIL", "ACDEF"], padding="max_length", max_length=16, truncation=True, return_tensors="pt"
+        )
+
+        embeddings = ume.embed(dict(batch), aggregate=False)
+
+        with torch.no_grad():
+            expected = ume.model.model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"])
+
+        mask = batch["attention_mask"].bool()
+        assert embeddings.shape == expected.shape
+        torch.testing.assert_close(embeddings[mask], expected[mask])
+
+    def test_sdpa_backend_matches_single_sequences(self):
+        """With the SDPA backend, sequences in a batch must not attend to each other."""
+        torch.manual_seed(0)
+
+        ume = UME(model_name="UME_mini", max_length=16, attention_backend="sdpa")
+        ume.eval()
+
+        assert ume.attention_backend == "sdpa"
+        assert ume.use_flash_attn is False
+        assert ume.model.config.padding == "unpadded"
+
+        sequences = ["MKTVRQERLKSIVRIL", "ACDEF"]
+        tokenizer = ume.get_tokenizer("amino_acid")
+
+        batch = tokenizer(sequences, padding="max_length", max_length=16, truncation=True, return_tensors="pt")
+        batched = ume.embed(dict(batch), aggregate=False)
+
+        for i, sequence in enumerate(sequences):
+            single = tokenizer([sequence], padding="max_length", max_length=16, truncation=True, return_tensors="pt")
+            expected = ume.embed(dict(single), aggregate=False)
+            length = int(single["attention_mask"].sum())
+
+            torch.testing.assert_close(batched[i, :length], expected[0, :length], rtol=1e-4, atol=1e-4)
+
+    def test_embed_position_ids_are_vectorized(self):
+        ume = UME(model_name="UME_mini", max_length=16)
+        ume.eval()
+
+        tokenizer = ume.get_tokenizer("amino_acid")
+
+        def count_arange_calls(batch_size: int) -> int:
+            inputs = tokenizer(["ACDEF"] * batch_size, padding="max_length", max_length=16, return_tensors="pt")
+
+            with patch("torch.arange", wraps=torch.arange) as mock_arange:
+                ume.embed(dict(inputs))
+
+            return mock_arange.call_count
+
+        # No per-sequence loop over cu_seqlens to build the position ids
+        assert count_arange_calls(2) == count_arange_calls(16)
+
+    def test_embed_combined_batch_matches_per_view_embed(self):
+        torch.manual_seed(0)
+
+        ume = UME(model_name="UME_mini", max_length=16)
+        ume.eval()
+
+        tokenizer = ume.get_tokenizer("amino_acid")
+        views = [
+            tokenizer(sequences, padding="max_length", max_length=16, truncation=True, return_tensors="pt")
+            for sequences in (["MKTVRQERLK", "ACDEF"], ["MKTV", "ACDEFGHIKL"], ["MK", "ACD"])
+        ]
+        batch = {
+            "input_ids": torch.stack([view["input_ids"] for view in views], dim=1),
+            "attention_mask": torch.stack([view["attention_mask"] for view in views], dim=1),
+        }
+
+        embeddings = ume._embed_combined_batch(batch)
+
+        assert len(embeddings) == 3
+        for view, embedding in zip(views, embeddings):
+            assert embedding.shape == (2, ume.embedding_dim)
+            torch.testing.assert_close(embedding, ume.embed(dict(view)), rtol=1e-4, atol=1e-4)
+
+    def test_embed_frozen(self):
+        ume = UME(model_name="UME_mini", max_length=16)
+        ume.freeze()
+
+        tokenizer = ume.get_tokenizer("amino_acid")
+        inputs = tokenizer(["MKTVRQ", "ACD"], padding="max_length", max_length=16, return_tensors="pt")
+
+        embeddings = ume.embed(dict(inputs))
+
+        assert not embeddings.requires_grad
+        assert not embeddings.is_inference()
+
+        # Frozen embeddings can still be used to train a head on top
+        head = torch.nn.Linear(ume.embedding_dim, 1)
+        head(embeddings).sum().backward()
+        assert head.weight.grad is not None
+
+    def test_mask_inputs(self):
+        ume = UME(model_name="UME_mini", max_length=16)
+        flex_bert = ume.model
+
+        input_ids = torch.tensor([[flex_bert.cls_token_id, 10, 11, 12, flex_bert.eos_token_id, flex_bert.pad_token_id]])
+        input_ids = input_ids.repeat(64, 1)
+
+        masked_input_ids, labels = flex_bert._mask_inputs(input_ids)
+
+        masked = labels != -100
+        assert masked.any()
+        assert not masked[:, [0, 4, 5]].any()  # cls, eos and pad are never masked
+        assert (masked_input_ids[masked] == flex_bert.mask_token_id).all()
+        assert torch.equal(masked_input_ids[~masked], input_ids[~masked])
+        assert torch.equal(labels[masked], input_ids[masked])
+
+    def test_embed_unpadded_mean_pools_real_tokens(self):
+        """Aggregated embeddings must average over the non-padding tokens only."""
+        torch.manual_seed(0)
+
+        ume = UME(model_name="UME_mini", max_length=16, use_flash_attn=False)
+        ume.eval()
+
+        tokenizer = ume.get_tokenizer("amino_acid")
+        batch = tokenizer(["MKTVRQERLK", "ACD"], padding="max_length", max_length=16, return_tensors="pt")
+
+        pooled = ume.embed(dict(batch), aggregate=True)
+        per_token = ume.embed(dict(batch), aggregate=False)
+
+        mask = batch["attention_mask"].unsqueeze(-1).float()
+        expected = (per_token * mask).sum(dim=1) / mask.sum(dim=1)
+
+        assert pooled.shape == (2, ume.embedding_dim)
+        torch.testing.assert_close(pooled, expected)
+
     def test_embed_sequences_gpu_flash_attn(self):
         """Test UME's embed_sequences method with and without flash-attn on GPU."""
         # Skip if not on GPU
@@ -305,7 +596,9 @@ class TestUME:
         mock_model = MagicMock()
         mock_load_checkpoint.return_value = mock_model
 
-        result = UME.from_pretrained("ume-mini-base-12M")
+        _warn_prerelease_checkpoints.cache_clear()
+        with pytest.warns(UserWarning, match="pre-release UME checkpoints"):
+            result = UME.from_pretrained("ume-mini-base-12M")
 
         mock_get_checkpoints.assert_called_once()
 
@@ -318,10 +611,24 @@ class TestUME:
             load_func=UME.load_from_checkpoint,
             device=None,
             use_flash_attn=None,
+            torch_dtype=None,
+            compile=False,
         )
 
         assert result == mock_model
 
+        # Loaded once, then served from the cache until cleared. The warning is only shown once
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert UME.from_pretrained("ume-mini-base-12M") is mock_model
+        mock_load_checkpoint.assert_called_once()
+
+        UME.clear_cache()
+        UME.from_pretrained("ume-mini-base-12M")
+        assert mock_load_checkpoint.call_count == 2
+
+        UME.clear_cache()
+
     def test_load_checkpoint_disable_flash_attn_cpu_inference(self):
         """Test loading UME checkpoint trained with flash-attn, disabling it, and running inference on CPU."""
         # Suppress boto3/S3 debug logging
@@ -3,7 +3,28 @@ from unittest.mock import MagicMock, call, patch
 import pytest
 from botocore.exceptions import ClientError, CredentialRetrievalError, NoCredentialsError
 
-from lobster.model._utils_checkpoint import _download_checkpoint, download_checkpoint, load_checkpoint_with_retry
+from lobster.model._utils_checkpoint import (
+    CHECKPOINT_TRANSFER_CONFIG,
+    _download_checkpoint,
+    download_checkpoint,
+    get_ume_checkpoints,
+    load_checkpoint_with_retry,
+)
+
+
+@patch("lobster.model._utils_checkpoint.boto3.client")
+def test_get_ume_checkpoints_cached(mock_client):
+    """Test that the checkpoint registry is only fetched from S3 once."""
+    mock_client.return_value.get_object.return_value = {
+        "Body": MagicMock(read=MagicMock(return_value=b'{"ume-mini-base-12M": "s3://bucket/mini.ckpt"}'))
+    }
+    get_ume_checkpoints.cache_clear()
+
+    assert get_ume_checkpoints() == {"ume-mini-base-12M": "s3://bucket/mini.ckpt"}
+    assert get_ume_checkpoints() is get_ume_checkpoints()
+    mock_client.return_value.get_object.assert_called_once()
+
+    get_ume_checkpoints.cache_clear()
 
 
 # Test download_checkpoint function
@@ -48,7 +69,9 @@ def test_download_checkpoint_success(mock_makedirs, mock_download_s3):
     _download_checkpoint("s3://bucket/checkpoint.ckpt", "/tmp/model.ckpt", "model.ckpt")
 
     mock_makedirs.assert_called_once_with("/tmp", exist_ok=True)
-    mock_download_s3.assert_called_once_with("s3://bucket/checkpoint.ckpt", "/tmp/model.ckpt")
+    mock_download_s3.assert_called_once_with(
+        "s3://bucket/checkpoint.ckpt", "/tmp/model.ckpt", transfer_config=CHECKPOINT_TRANSFER_CONFIG
+    )
 
 
 @patch("lobster.model._utils_checkpoint.download_from_s3")
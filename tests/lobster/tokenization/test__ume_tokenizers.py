@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 import torch
 
@@ -154,3 +156,41 @@ class TestUMETokenizerTransform:
         transform = UMETokenizerTransform(modality=modality, max_length=max_length, return_modality=True)
         out = transform(input_batch)
         assert torch.equal(out["input_ids"], expected_input_ids)
+
+    def test_batch_encode(self):
+        transform = UMETokenizerTransform(modality="amino_acid", max_length=8, return_modality=True)
+        out = transform.batch_encode(["AR", "VYK"])
+
+        assert out["input_ids"].tolist() == [[1, 28, 33, 4, 6], [1, 30, 42, 38, 4]]
+        assert out["attention_mask"].tolist() == [[1, 1, 1, 1, 0], [1, 1, 1, 1, 1]]
+        assert "modality" not in out
+
+        # Still truncated to max_length
+        out = transform.batch_encode(["ACDEFGHIKLMNPQ"])
+        assert out["input_ids"].shape == (1, 8)
+
+    def test_shared_tokenizer(self):
+        UMETokenizerTransform.batch_load(["amino_acid", "SMILES", Modality.NUCLEOTIDE])
+        assert set(UMETokenizerTransform._tokenizers) >= {Modality.AMINO_ACID, Modality.SMILES, Modality.NUCLEOTIDE}
+
+        short = UMETokenizerTransform(modality="amino_acid", max_length=4)
+        long = UMETokenizerTransform(modality="amino_acid", max_length=8)
+
+        # Each transform gets its own copy of the loaded tokenizer
+        assert short.tokenizer is short.tokenizer
+        assert short.tokenizer is not long.tokenizer
+        assert short.tokenizer.get_vocab() == long.tokenizer.get_vocab()
+
+        # Padding/truncation settings don't leak between transforms
+        assert short("ACDEF")["input_ids"].shape == (1, 4)
+        assert long("ACDEF")["input_ids"].shape == (1, 8)
+        assert short("ACDEF")["input_ids"].shape == (1, 4)
+
+        # ... including when the transforms are used from different threads
+        transforms = [
+            UMETokenizerTransform(modality="amino_acid", max_length=max_length) for max_length in [4, 8] * 100
+        ]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            shapes = list(executor.map(lambda transform: transform("ACDEF")["input_ids"].shape, transforms))
+
+        assert shapes == [(1, 4), (1, 8)] * 100